@@ -1,6 +1,7 @@
 import os
 import requests
 from dotenv import load_dotenv
+from service_client import ServiceClient, IDEMPOTENT_METHODS
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timezone, timedelta
@@ -10,6 +11,8 @@ load_dotenv()
 BASE_URL = os.getenv("ORDER_RECORDS_API")  # e.g., http://order-records:5000
 GRAPHQL_URL = f"{BASE_URL}/graphql"
 UPDATE_URL = f"{BASE_URL}/orders"  # for REST PATCH updates
+BATCH_UPDATE_URL = f"{BASE_URL}/orders:batch"
+MAX_BATCH_UPDATE = 500  # order records applies each batch as one Firestore batched write
 LATE_CHARGE_URL = os.getenv("LATE_CHARGE_URL")  # e.g., http://late-charge:5001/lateCharge
 USER_SERVICE_API = os.getenv("USER_SERVICE_API", "https://personal-s5llcxwn.outsystemscloud.com/userMS/rest/user")
 USER_UPDATE_ENDPOINT = f"{USER_SERVICE_API}/updateUserScore"
@@ -20,14 +23,36 @@ TRIGGER_HOUR = int(os.getenv("TRIGGER_HOUR", 0))
 TRIGGER_MINUTE = int(os.getenv("TRIGGER_MINUTE", 0))
 TIMEZONE = "Asia/Singapore"  # Allowed to remain hardcoded
 
-def update_order_status(order_id, new_status):
-    """Updates the order's status by sending a PATCH request."""
-    url = f"{UPDATE_URL}/{order_id}"
-    try:
-        response = requests.patch(url, json={"status": new_status}, timeout=10)
-        response.raise_for_status()
-    except Exception:
-        pass
+# Pooled HTTP clients, one per downstream, with per-service timeouts.
+# Order status PATCHes set an absolute value, so they are safe to retry.
+order_records_client = ServiceClient("order-records", read_timeout=30, retry_methods=IDEMPOTENT_METHODS | {"PATCH"})
+late_charge_client = ServiceClient("late-charge", read_timeout=30)
+user_client = ServiceClient("user", connect_timeout=5, read_timeout=15)  # OutSystems, over the WAN
+notification_client = ServiceClient("notification", read_timeout=15)
+
+def update_order_statuses(updates):
+    """
+    Updates many order statuses with one PATCH per MAX_BATCH_UPDATE orders.
+    Returns the set of orderIDs whose update failed.
+    """
+    failed = set()
+    for start in range(0, len(updates), MAX_BATCH_UPDATE):
+        chunk = updates[start:start + MAX_BATCH_UPDATE]
+        try:
+            response = order_records_client.patch(BATCH_UPDATE_URL, json={"updates": chunk})
+            response.raise_for_status()
+            results = response.json().get("results", [])
+        except Exception as e:
+            print(f"❌ Batch status update of {len(chunk)} orders failed: {e}")
+            failed.update(str(update["orderID"]) for update in chunk)
+            continue
+        for result in results:
+            if not result.get("ok"):
+                print(f"❌ Status update failed for order {result.get('orderID')}: {result.get('error')}")
+                failed.add(str(result.get("orderID")))
+    if failed:
+        print(f"⚠️ {len(failed)} of {len(updates)} status updates failed; they are retried on the next run")
+    return failed
 
 def update_user_score(order):
     """Updates the user score by sending a PUT request to the User service."""
@@ -36,7 +61,7 @@ def update_user_score(order):
         "change": 5
     }
     try:
-        response = requests.put(USER_UPDATE_ENDPOINT, json=payload, timeout=10)
+        response = user_client.put(USER_UPDATE_ENDPOINT, json=payload)
         response.raise_for_status()
     except Exception:
         pass
@@ -58,7 +83,7 @@ def send_to_late_charge_and_get_response(order):
         "overdue14": order.get("overdue14", False)
     }
     try:
-        resp = requests.post(LATE_CHARGE_URL, json=payload, timeout=10)
+        resp = late_charge_client.post(LATE_CHARGE_URL, json=payload)
         resp.raise_for_status()
         return resp.json()  # Expected to return { "lateCharge": <value>, "productName": <value> }
     except Exception:
@@ -72,7 +97,7 @@ def get_user_email(user_id):
     """
     email_url = f"{USER_SERVICE_API}/getEmail/?id={user_id}"
     try:
-        resp = requests.get(email_url, timeout=10)
+        resp = user_client.get(email_url)
         resp.raise_for_status()
         data = resp.json()
         return data.get("email")
@@ -104,7 +129,7 @@ def send_to_notification(order, late_charge):
         "productID": order.get("productID")
     }
     try:
-        requests.post(NOTIFICATION_SERVICE_URL, json=payload, timeout=10)
+        notification_client.post(NOTIFICATION_SERVICE_URL, json=payload)
     except Exception:
         pass
 
@@ -113,7 +138,7 @@ def fetch_and_update_orders():
     Retrieves overdue orders via the GraphQL endpoint.
     For each order:
       - Checks if the order is >14 days overdue.
-      - Updates the order's status:
+      - Updates the order's status (all status changes are sent in batches first):
            * Sets to "completed" if >14 days overdue.
            * Sets to "late" if not >14 days overdue and current status is not "late".
       - Updates the user score.
@@ -135,11 +160,13 @@ def fetch_and_update_orders():
     }
     """
     try:
-        resp = requests.post(GRAPHQL_URL, json={"query": query}, timeout=10)
+        resp = order_records_client.post(GRAPHQL_URL, json={"query": query})
         resp.raise_for_status()
         data = resp.json()
         orders = data.get("data", {}).get("overdueOrders", [])
         now = datetime.now(timezone.utc)
+        processed = []
+        status_updates = []
         for order in orders:
             order_id = order.get("orderID")
             current_status = order.get("status", "").lower()
@@ -153,15 +180,24 @@ def fetch_and_update_orders():
 
             if is_overdue_14:
                 if current_status != "completed":
-                    update_order_status(order_id, "completed")
+                    status_updates.append({"orderID": order_id, "status": "completed"})
                     order["status"] = "completed"
             else:
                 if current_status != "late":
-                    update_order_status(order_id, "late")
+                    status_updates.append({"orderID": order_id, "status": "late"})
                     order["status"] = "late"
 
-            update_user_score(order)
             order["overdue14"] = is_overdue_14
+            processed.append(order)
+
+        failed = update_order_statuses(status_updates)
+
+        for order in processed:
+            # Orders whose status did not change are still overdue on the next run, so
+            # they are scored, charged and notified then instead of twice
+            if str(order.get("orderID")) in failed:
+                continue
+            update_user_score(order)
 
             # Send to Late Charge service and get its response
             lc_response = send_to_late_charge_and_get_response(order)
@@ -2,6 +2,7 @@ import os
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 import requests
+from service_client import ServiceClient
 import sys
 import logging
 
@@ -39,6 +40,9 @@ DAMAGE_DEDUCTIONS = {
 
 DAMAGE_THRESHOLD = 30  # If newConditionScore < this, availability is set to False
 
+# Pooled HTTP client for the Zyla API, over the WAN
+zyla_client = ServiceClient("zyla", connect_timeout=5, read_timeout=30)
+
 def compare_images_via_zyla(url_image1, url_image2):
     """
     Calls the Zyla Image Similarity Calculator API via a GET request.
@@ -56,7 +60,7 @@ def compare_images_via_zyla(url_image1, url_image2):
         "url2": url_image2
     }
 
-    response = requests.get(endpoint, headers=headers, params=params)
+    response = zyla_client.get(endpoint, headers=headers, params=params)
     if response.status_code == 200:
         return response.json()
     else:
@@ -1,15 +1,28 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, request, jsonify, make_response, Response, stream_with_context
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.api_core.exceptions import NotFound
 from flask_cors import CORS
 import pika
 import json
 import time
 import threading
+import os
+import queue
+import bisect
+import collections
+import hashlib
+import itertools
+import math
+import re
 import sys
 import logging
+from datetime import datetime, timedelta, timezone
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 
+RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", "rabbitmq")
+EXCHANGE_NAME = os.environ.get("EXCHANGE_NAME", "order_exchange")
+
 app = Flask(__name__)
 
 # Configure CORS - Allow all origins for development
@@ -17,8 +30,8 @@ CORS(app, resources={
     r"/*": {
         "origins": "*",  # Allow all origins in development
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "Accept", "Origin"],
-        "expose_headers": ["Content-Type"],
+        "allow_headers": ["Content-Type", "Authorization", "Accept", "Origin", "If-None-Match"],
+        "expose_headers": ["Content-Type", "ETag"],
         "supports_credentials": False,
         "send_wildcard": True
     }
@@ -29,50 +42,632 @@ cred = credentials.Certificate("serviceAccountKey.json")
 firebase_admin.initialize_app(cred)
 db = firestore.client()
 
-class InventoryService:
+# Fields returned by the product listing (the storefront does not need shipping dimensions)
+LISTING_FIELDS = ["productID", "productName", "productDesc", "originalImageUrl", "conditionScore",
+                  "price", "availability", "userID", "itemPrice"]
+MAX_PAGE_SIZE = 500
+# Maximum productIDs per batchGet request, and per Firestore get_all call
+MAX_BATCH_GET = 300
+GET_ALL_CHUNK_SIZE = 100
+DEFAULT_SEARCH_PAGE_SIZE = 20
+
+# Seconds clients may reuse a product response before revalidating with If-None-Match
+PRODUCT_CACHE_MAX_AGE = int(os.environ.get("PRODUCT_CACHE_MAX_AGE", 0))
+
+def product_doc_id(product_id):
+    """Deterministic inventory-db document ID for a productID (see migrate_product_doc_ids.py)."""
+    return str(product_id)
+
+def product_version(update_time):
+    """
+    Version of a product document: its Firestore update time in nanoseconds.
+    Firestore moves update_time forward on every write, so every update path
+    bumps the version without storing a counter in the document.
+    """
+    if update_time is None:
+        return None
+    timestamp = update_time.timestamp_pb() if hasattr(update_time, "timestamp_pb") else update_time
+    return timestamp.seconds * 1000000000 + timestamp.nanos
+
+# Orders whose transaction.successful event has already been applied (document ID = orderID).
+# Each record carries an expireAt timestamp; a Firestore TTL policy on that field deletes old records:
+#   gcloud firestore fields ttls update expireAt --collection-group=inventory-processed-orders --enable-ttl
+PROCESSED_ORDERS_COLLECTION = "inventory-processed-orders"
+# Days a processed order is remembered; redeliveries of older events are not deduplicated
+PROCESSED_ORDER_TTL_DAYS = int(os.environ.get("PROCESSED_ORDER_TTL_DAYS", 30))
+# Each order costs two writes and a Firestore batch holds at most 500
+MAX_CONSUMER_BATCH = 250
+
+
+class InventoryEventPublisher:
+    """
+    Publishes inventory.changed events so product caches in other services can invalidate.
+
+    publish_change() only enqueues, so product writes never wait on the broker.
+    A background thread owns the connection and retries each event until the
+    broker accepts it; until then caches fall back on their TTL.
+    """
+
+    routing_key = "inventory.changed"
+
+    def __init__(self, host, exchange, max_pending=10000, reconnect_delay=5):
+        self.host = host
+        self.exchange = exchange
+        self.reconnect_delay = reconnect_delay
+        self.events = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.started = False
+
+    def _connect(self):
+        connection = pika.BlockingConnection(pika.ConnectionParameters(
+            host=self.host, connection_attempts=1, socket_timeout=2, blocked_connection_timeout=5, heartbeat=60))
+        channel = connection.channel()
+        channel.exchange_declare(exchange=self.exchange, exchange_type='topic', durable=True)
+        return connection, channel
+
+    def publish_change(self, product_id, change):
+        """Queue a change notification for product_id ("added", "updated" or "removed")."""
+        with self.lock:
+            if not self.started:
+                publisher_thread = threading.Thread(target=self._publish_loop, name="inventory-event-publisher")
+                publisher_thread.daemon = True
+                publisher_thread.start()
+                self.started = True
+        body = json.dumps({"productID": product_id, "change": change, "timestamp": time.time()})
+        try:
+            self.events.put_nowait((product_id, body))
+        except queue.Full:
+            logging.warning(f"Event queue full, dropping inventory.changed for product {product_id}")
+
+    def _publish_loop(self):
+        connection = channel = None
+        event = None
+        while True:
+            try:
+                if event is None:
+                    try:
+                        event = self.events.get(timeout=30)
+                    except queue.Empty:
+                        # Idle: service heartbeats so the broker keeps the connection
+                        if connection is not None and connection.is_open:
+                            connection.process_data_events(time_limit=0)
+                        continue
+                if channel is None or channel.is_closed or connection.is_closed:
+                    connection, channel = self._connect()
+                product_id, body = event
+                channel.basic_publish(
+                    exchange=self.exchange,
+                    routing_key=self.routing_key,
+                    body=body,
+                    properties=pika.BasicProperties(content_type='application/json')
+                )
+                event = None
+            except Exception as e:
+                pending = f" for product {event[0]}" if event else ""
+                logging.warning(f"Failed to publish inventory.changed{pending}, retrying in {self.reconnect_delay}s: {e!r}")
+                connection = channel = None
+                time.sleep(self.reconnect_delay)
+
+
+class ProductSearchIndex:
+    """
+    Inverted index over product text plus sorted numeric facets.
+
+    Terms from productName count TEXT_FIELDS["productName"] times as much as
+    terms from productDesc. Results are ranked with a saturated TF-IDF score,
+    and the last query term also matches as a prefix so partially typed words
+    find results. Not thread-safe on its own: ProductCatalog updates and
+    queries it under its lock.
+    """
+
+    TEXT_FIELDS = {"productName": 3, "productDesc": 1}
+    FACET_FIELDS = ["price", "itemPrice", "conditionScore"]
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
     def __init__(self):
+        self.postings = collections.defaultdict(dict)   # term -> {productID: weighted term frequency}
+        self.doc_terms = {}                             # productID -> terms indexed for it
+        self.vocabulary = []                            # sorted terms, for prefix matching
+        self.facets = {field: [] for field in self.FACET_FIELDS}  # field -> sorted (value, productID)
+        self.facet_values = {}                          # productID -> {field: value}
+
+    @classmethod
+    def tokenize(cls, text):
+        return cls.TOKEN_PATTERN.findall(str(text).lower()) if text else []
+
+    def add(self, product_id, data):
+        frequencies = collections.Counter()
+        for field, weight in self.TEXT_FIELDS.items():
+            for term in self.tokenize(data.get(field)):
+                frequencies[term] += weight
+        for term, frequency in frequencies.items():
+            if not self.postings[term]:
+                bisect.insort(self.vocabulary, term)
+            self.postings[term][product_id] = frequency
+        self.doc_terms[product_id] = list(frequencies)
+
+        values = {}
+        for field in self.FACET_FIELDS:
+            value = data.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                bisect.insort(self.facets[field], (value, product_id))
+                values[field] = value
+        self.facet_values[product_id] = values
+
+    def remove(self, product_id):
+        for term in self.doc_terms.pop(product_id, ()):
+            postings = self.postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self.postings[term]
+                index = bisect.bisect_left(self.vocabulary, term)
+                if index < len(self.vocabulary) and self.vocabulary[index] == term:
+                    del self.vocabulary[index]
+        for field, value in self.facet_values.pop(product_id, {}).items():
+            entries = self.facets[field]
+            index = bisect.bisect_left(entries, (value, product_id))
+            if index < len(entries) and entries[index] == (value, product_id):
+                del entries[index]
+
+    def _in_range(self, field, low, high):
+        entries = self.facets[field]
+        start = bisect.bisect_left(entries, (low, -math.inf)) if low is not None else 0
+        end = bisect.bisect_right(entries, (high, math.inf)) if high is not None else len(entries)
+        return {product_id for _, product_id in entries[start:end]}
+
+    def _expand(self, term, prefix):
+        if not prefix:
+            return [term] if term in self.postings else []
+        start = bisect.bisect_left(self.vocabulary, term)
+        matches = []
+        for candidate in self.vocabulary[start:]:
+            if not candidate.startswith(term):
+                break
+            matches.append(candidate)
+        return matches
+
+    def search(self, query, ranges, allowed=None):
+        """
+        Args:
+            query: Free text; empty matches every product
+            ranges: {facet field: (low, high)}, either bound may be None
+            allowed: Optional set of productIDs to restrict results to
+        Returns:
+            [(score, productID)], best match first (productID order when query is empty)
+        """
+        candidates = allowed
+        for field, (low, high) in ranges.items():
+            in_range = self._in_range(field, low, high)
+            candidates = in_range if candidates is None else candidates & in_range
+
+        terms = self.tokenize(query)
+        if not terms:
+            ids = candidates if candidates is not None else self.facet_values.keys()
+            return [(0.0, product_id) for product_id in sorted(ids)]
+
+        document_count = max(len(self.doc_terms), 1)
+        scores = collections.defaultdict(float)
+        for position, term in enumerate(terms):
+            is_last = position == len(terms) - 1
+            for match in self._expand(term, prefix=is_last and len(term) >= 2):
+                postings = self.postings[match]
+                idf = math.log(1 + document_count / len(postings))
+                # Exact matches outrank completions of a partially typed word
+                boost = 1.0 if match == term else 0.5
+                for product_id, frequency in postings.items():
+                    if candidates is None or product_id in candidates:
+                        scores[product_id] += boost * idf * frequency / (frequency + 1.2)
+        return sorted(((score, product_id) for product_id, score in scores.items()),
+                      key=lambda item: (-item[0], item[1]))
+
+
+class ProductCatalog:
+    """
+    In-memory, indexed snapshot of the inventory-db collection.
+
+    Products are indexed by productID, with secondary indexes by userID and
+    availability plus a ProductSearchIndex, and kept current by a Firestore
+    snapshot listener. Writes made
+    by this process are applied immediately so reads see them before the listener
+    echoes them back. Each product carries its version (see product_version) for
+    ETags. Callers must check is_fresh() and fall back to querying Firestore while
+    the listener is (re)connecting.
+
+    A listener can stop delivering without reporting itself closed, so the
+    catalog also counts as stale once no snapshot has arrived for max_staleness
+    seconds. The listener only calls back when something changes, so the monitor
+    then re-attaches it; its initial snapshot reloads and re-validates the catalog.
+    """
+
+    def __init__(self, collection, check_interval=30, max_staleness=None):
+        self.collection = collection
+        self.check_interval = check_interval
+        self.max_staleness = max_staleness or int(os.environ.get("CATALOG_MAX_STALENESS", 300))
+        self.lock = threading.RLock()
+        self.watch = None
+        self.ready = False
+        self.last_snapshot = None  # time.monotonic() of the last listener callback
+        self._reset()
+
+    def _reset(self):
+        self.by_id = {}                      # productID -> product data (with "_docID", "_version")
+        self.by_doc = {}                     # document ID -> productID
+        self.sorted_ids = []                 # productIDs in ascending order
+        self.by_user = collections.defaultdict(set)
+        self.by_availability = {True: set(), False: set()}
+        self.max_version = 0                 # newest product version seen
+        self.search_index = ProductSearchIndex()
+
+    def start(self):
+        """Attach the snapshot listener and a monitor that re-attaches it if it dies."""
+        self._listen()
+        monitor_thread = threading.Thread(target=self._monitor)
+        monitor_thread.daemon = True
+        monitor_thread.start()
+
+    def _listen(self):
+        with self.lock:
+            self.ready = False
+        self.watch = self.collection.on_snapshot(self._on_snapshot)
+
+    def _monitor(self):
+        while True:
+            time.sleep(self.check_interval)
+            if self.watch is None or getattr(self.watch, "_closed", False):
+                logging.debug("Product catalog listener closed, re-attaching")
+            elif self.ready and self._snapshot_age() > self.max_staleness:
+                logging.warning(f"No product catalog snapshot for {self._snapshot_age():.0f}s, re-attaching")
+                try:
+                    self.watch.unsubscribe()
+                except Exception as e:
+                    logging.debug(f"Failed to close product catalog listener: {str(e)}")
+            else:
+                continue
+            try:
+                self._listen()
+            except Exception as e:
+                logging.debug(f"Failed to re-attach product catalog listener: {str(e)}")
+
+    def _snapshot_age(self):
+        last_snapshot = self.last_snapshot
+        return float("inf") if last_snapshot is None else time.monotonic() - last_snapshot
+
+    def is_fresh(self):
+        return (self.ready and self.watch is not None and not getattr(self.watch, "_closed", False)
+                and self._snapshot_age() <= self.max_staleness)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self.lock:
+            self.last_snapshot = time.monotonic()
+            if not self.ready:
+                # Initial snapshot after (re)attaching: rebuild from the full result
+                self._reset()
+                for doc in docs:
+                    self._put(doc.id, doc.to_dict(), product_version(doc.update_time))
+                self.ready = True
+                logging.debug(f"Product catalog loaded {len(self.by_id)} products")
+                return
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    self._drop(self.by_doc.get(change.document.id))
+                else:
+                    self._put(change.document.id, change.document.to_dict(),
+                              product_version(change.document.update_time))
+
+    def _put(self, doc_id, data, version):
+        product_id = data.get("productID")
+        if product_id is None:
+            return
+        self._drop(product_id)
+        data["_docID"] = doc_id
+        data["_version"] = version
+        if version is not None and version > self.max_version:
+            self.max_version = version
+        self.by_id[product_id] = data
+        self.by_doc[doc_id] = product_id
+        bisect.insort(self.sorted_ids, product_id)
+        self.by_user[data.get("userID")].add(product_id)
+        self.by_availability[bool(data.get("availability"))].add(product_id)
+        self.search_index.add(product_id, data)
+
+    def _drop(self, product_id):
+        data = self.by_id.pop(product_id, None)
+        if data is None:
+            return
+        self.by_doc.pop(data["_docID"], None)
+        index = bisect.bisect_left(self.sorted_ids, product_id)
+        if index < len(self.sorted_ids) and self.sorted_ids[index] == product_id:
+            del self.sorted_ids[index]
+        self.by_user[data.get("userID")].discard(product_id)
+        self.by_availability[bool(data.get("availability"))].discard(product_id)
+        self.search_index.remove(product_id)
+
+    def upsert(self, doc_id, data, version):
+        """Apply a product written by this process, with the version from the write result."""
+        with self.lock:
+            self._put(doc_id, dict(data), version)
+
+    def patch(self, product_id, update_data, version):
+        """Apply a partial update written by this process, with the version from the write result."""
+        with self.lock:
+            data = self.by_id.get(product_id)
+            if data is not None:
+                self._put(data["_docID"], dict(data, **update_data), version)
+
+    def get(self, product_id):
+        return self.get_versioned(product_id)[0]
+
+    def get_versioned(self, product_id):
+        """Return (product, version), or (None, None) if there is no such product."""
+        with self.lock:
+            data = self.by_id.get(product_id)
+            if data is None:
+                return None, None
+            return self._public(data), data["_version"]
+
+    def version_tag(self):
+        """
+        Changes whenever any product is added, updated or removed: a write gives
+        some product a newer version, and a removal changes the count.
+        """
+        with self.lock:
+            return f"{len(self.by_id)}-{self.max_version}"
+
+    def products_for_user(self, user_id):
+        with self.lock:
+            return [self._public(self.by_id[pid]) for pid in sorted(self.by_user.get(user_id, ()))]
+
+    def iter_sorted(self, after=None, availability=None, limit=None):
+        """Products in productID order, starting after the cursor, optionally filtered by availability."""
+        with self.lock:
+            start = bisect.bisect_right(self.sorted_ids, after) if after is not None else 0
+            ids = self.sorted_ids[start:]
+            wanted = self.by_availability[availability] if availability is not None else None
+            results = []
+            for product_id in ids:
+                if wanted is not None and product_id not in wanted:
+                    continue
+                results.append(self._public(self.by_id[product_id]))
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+    def search(self, query, ranges, availability=None, limit=DEFAULT_SEARCH_PAGE_SIZE, offset=0):
+        """Ranked search; returns ([(product, score)] for the requested page, total number of matches)."""
+        with self.lock:
+            allowed = set(self.by_availability[availability]) if availability is not None else None
+            matches = self.search_index.search(query, ranges, allowed)
+            page = [(self._public(self.by_id[product_id]), score)
+                    for score, product_id in matches[offset:offset + limit]]
+            return page, len(matches)
+
+    @staticmethod
+    def _public(data):
+        return {key: value for key, value in data.items() if key not in ("_docID", "_version")}
+
+
+class ProductIDAllocator:
+    """
+    Hands out unique productIDs from memory.
+
+    Each process leases a block of PRODUCT_ID_BLOCK_SIZE IDs at a time by
+    advancing a counter document in a Firestore transaction, so concurrent
+    processes never receive overlapping ranges. The counter is seeded from the
+    highest existing productID the first time it is used. IDs left in a block
+    when a process exits are skipped, never reused.
+    """
+
+    def __init__(self, collection, counter_ref, block_size=None):
+        self.collection = collection
+        self.counter_ref = counter_ref
+        self.block_size = block_size or int(os.environ.get("PRODUCT_ID_BLOCK_SIZE", 20))
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.block_end = 0  # exclusive
+
+    def allocate(self):
+        with self.lock:
+            if self.next_id >= self.block_end:
+                self.next_id, self.block_end = self._lease_block()
+            product_id = self.next_id
+            self.next_id += 1
+            return product_id
+
+    def _highest_product_id(self):
+        products = self.collection.order_by("productID", direction=firestore.Query.DESCENDING).limit(1).stream()
+        for doc in products:
+            return doc.to_dict().get("productID", 0)
+        return 0
+
+    def _lease_block(self):
+        block_size = self.block_size
+        counter_ref = self.counter_ref
+        seed = None
+        if not counter_ref.get().exists:
+            seed = self._highest_product_id() + 1
+
+        @firestore.transactional
+        def lease(transaction):
+            snapshot = counter_ref.get(transaction=transaction)
+            start = snapshot.get("next") if snapshot.exists else (seed or self._highest_product_id() + 1)
+            transaction.set(counter_ref, {"next": start + block_size})
+            return start
+
+        start = lease(db.transaction())
+        logging.debug(f"Leased productID block [{start}, {start + block_size})")
+        return start, start + block_size
+
+
+class InventoryService:
+    def __init__(self, event_publisher=None, catalog=None):
         self.collection = db.collection("inventory-db")
+        self.event_publisher = event_publisher
+        self.catalog = catalog
+        self.id_allocator = ProductIDAllocator(self.collection, db.collection("counters").document("inventory-productID"))
 
-    def get_all_products(self):
-        """Fetch all products from the inventory."""
-        try:
-            product_ref = self.collection.stream()
-            
-            products = []
-            for doc in product_ref:
-                data = doc.to_dict()
-                # data["id"] = doc.id  # Add document ID for reference
-                products.append({
-                    # "id": doc.id,
-                    "productID": data.get("productID"),
-                    "productName": data.get("productName"),
-                    "productDesc": data.get("productDesc"),
-                    "originalImageUrl": data.get("originalImageUrl"),
-                    "conditionScore": data.get("conditionScore"),
-                    "price": data.get("price"),
-                    "availability": data.get("availability"),
-                    "userID": data.get("userID"),
-                    "itemPrice": data.get("itemPrice")
-                })
-
-            return products
-        except Exception as e:
-            logging.debug(f"Error fetching products: {str(e)}")
-            return {"error": str(e)}
+    def _notify_change(self, product_id, change):
+        if self.event_publisher is not None:
+            self.event_publisher.publish_change(product_id, change)
+
+    def iter_products(self, limit=None, after=None, availability=None):
+        """
+        Stream products in productID order, projected to the listing fields.
+
+        Args:
+            limit: Maximum number of products to return (None for all)
+            after: Cursor; only products with a productID greater than this are returned
+            availability: If not None, only products with this availability
+        """
+        if self.catalog is not None and self.catalog.is_fresh():
+            for data in self.catalog.iter_sorted(after, availability, limit):
+                yield {field: data.get(field) for field in LISTING_FIELDS}
+            return
+
+        query = self.collection
+        if availability is not None:
+            query = query.where("availability", "==", availability)
+        query = query.order_by("productID")
+        if after is not None:
+            query = query.start_after({"productID": after})
+        if limit is not None:
+            query = query.limit(limit)
+
+        for doc in query.select(LISTING_FIELDS).stream():
+            data = doc.to_dict()
+            yield {field: data.get(field) for field in LISTING_FIELDS}
         
     def get_product_by_id(self, product_id):
         """Fetch a specific product by its productID."""
+        return self.get_product_versioned(product_id)[0]
+
+    def get_product_versioned(self, product_id):
+        """Fetch a product and its version; (error dict, None) if it cannot be fetched."""
         try:
-            product_ref = self.collection.where("productID", "==", product_id).limit(1).stream()
-            
-            for doc in product_ref:
-                data = doc.to_dict()
-                # data["id"] = doc.id
-                return data
-                
-            return {"error": "Product not found."}
+            if self.catalog is not None and self.catalog.is_fresh():
+                product, version = self.catalog.get_versioned(product_id)
+                return (product, version) if product is not None else ({"error": "Product not found."}, None)
+
+            doc = self.collection.document(product_doc_id(product_id)).get()
+            if doc.exists:
+                return doc.to_dict(), product_version(doc.update_time)
+            return {"error": "Product not found."}, None
         except Exception as e:
             logging.debug(f"Error fetching product {product_id}: {str(e)}")
+            return {"error": str(e)}, None
+
+    def search_products(self, query, ranges, availability=None, limit=DEFAULT_SEARCH_PAGE_SIZE, offset=0):
+        """
+        Search the catalog, projected to the listing fields plus a relevance "score".
+        Returns (results, total), or None while the catalog is loading (search is served from memory only).
+        """
+        if self.catalog is None or not self.catalog.is_fresh():
+            return None
+        page, total = self.catalog.search(query, ranges, availability, limit, offset)
+        results = []
+        for data, score in page:
+            result = {field: data.get(field) for field in LISTING_FIELDS}
+            result["score"] = round(score, 4)
+            results.append(result)
+        return results, total
+
+    def listing_version(self):
+        """Version tag for the product listing, or None if it cannot be known without reading everything."""
+        if self.catalog is not None and self.catalog.is_fresh():
+            return self.catalog.version_tag()
+        return None
+            
+    def get_products_by_ids(self, product_ids):
+        """
+        Fetch many products at once.
+        Returns (products keyed by productID, list of productIDs not found).
+        """
+        products = {}
+        if self.catalog is not None and self.catalog.is_fresh():
+            for product_id in product_ids:
+                product = self.catalog.get(product_id)
+                if product is not None:
+                    products[product_id] = product
+        else:
+            unique_ids = list(dict.fromkeys(product_ids))
+            for start in range(0, len(unique_ids), GET_ALL_CHUNK_SIZE):
+                refs = [self.collection.document(product_doc_id(pid)) for pid in unique_ids[start:start + GET_ALL_CHUNK_SIZE]]
+                for doc in db.get_all(refs):
+                    if doc.exists:
+                        data = doc.to_dict()
+                        products[data.get("productID")] = data
+        missing = [pid for pid in dict.fromkeys(product_ids) if pid not in products]
+        return products, missing
+
+    def _existing_product_ids(self, product_ids):
+        """The subset of product_ids that exist, from the catalog or batched get_all reads."""
+        if self.catalog is not None and self.catalog.is_fresh():
+            return {product_id for product_id in product_ids if self.catalog.get(product_id) is not None}
+        by_doc_id = {product_doc_id(product_id): product_id for product_id in product_ids}
+        doc_ids = list(by_doc_id)
+        existing = set()
+        for start in range(0, len(doc_ids), GET_ALL_CHUNK_SIZE):
+            refs = [self.collection.document(doc_id) for doc_id in doc_ids[start:start + GET_ALL_CHUNK_SIZE]]
+            existing.update(by_doc_id[doc.id] for doc in db.get_all(refs, field_paths=["productID"]) if doc.exists)
+        return existing
+
+    def apply_successful_transactions(self, orders):
+        """
+        Mark the products of confirmed orders unavailable in a single batched write.
+
+        Args:
+            orders: list of (orderID, productID). Orders already applied (recorded
+                in PROCESSED_ORDERS_COLLECTION) or repeated in the list are skipped.
+        Returns:
+            The productIDs that were updated. Raises if the write fails.
+        """
+        processed = db.collection(PROCESSED_ORDERS_COLLECTION)
+        order_ids = {str(order_id) for order_id, _ in orders if order_id}
+        already_done = {snapshot.id for snapshot in db.get_all([processed.document(oid) for oid in order_ids])
+                        if snapshot.exists}
+        existing = self._existing_product_ids({product_id for order_id, product_id in orders
+                                               if not order_id or str(order_id) not in already_done})
+
+        batch = db.batch()
+        expire_at = datetime.now(timezone.utc) + timedelta(days=PROCESSED_ORDER_TTL_DAYS)
+        updated = []
+        write_index = {}  # productID -> position of its update in the batch
+        writes = 0
+        seen = set()
+        for order_id, product_id in orders:
+            key = str(order_id) if order_id else None
+            if key is not None and (key in already_done or key in seen):
+                continue
+            if key is not None:
+                seen.add(key)
+                batch.set(processed.document(key), {"productID": product_id, "processedAt": firestore.SERVER_TIMESTAMP,
+                                                    "expireAt": expire_at})
+                writes += 1
+            if product_id in updated:
+                continue
+            if product_id not in existing:
+                logging.debug(f"Product {product_id} not found.")
+                continue
+            batch.update(self.collection.document(product_doc_id(product_id)), {"availability": False})
+            write_index[product_id] = writes
+            writes += 1
+            updated.append(product_id)
+
+        results = batch.commit() if writes else []
+        for product_id in updated:
+            if self.catalog is not None:
+                self.catalog.patch(product_id, {"availability": False},
+                                   product_version(results[write_index[product_id]].update_time))
+            self._notify_change(product_id, "updated")
+        return updated
+
+    def get_products_by_user(self, user_id):
+        """Fetch all products listed by a user."""
+        try:
+            if self.catalog is not None and self.catalog.is_fresh():
+                return self.catalog.products_for_user(user_id)
+            return [doc.to_dict() for doc in self.collection.where("userID", "==", user_id).stream()]
+        except Exception as e:
+            logging.debug(f"Error fetching products for user {user_id}: {str(e)}")
             return {"error": str(e)}
             
     def add_product(self, product_data):
@@ -90,25 +685,21 @@ class InventoryService:
             if "conditionScore" not in product_data:
                 product_data["conditionScore"] = 100
                 
-            # Generate a new productID
-            try:
-                products = self.collection.order_by("productID", direction=firestore.Query.DESCENDING).limit(1).stream()
-                highest_id = 0
-                for doc in products:
-                    highest_id = doc.to_dict().get("productID", 0)
-                product_data["productID"] = highest_id + 1
-            except:
-                # Fallback to a timestamp-based ID if query fails
-                import time
-                product_data["productID"] = int(time.time())
+            # Allocate a new productID from this process's leased block
+            product_data["productID"] = self.id_allocator.allocate()
             
-            # Add the product to Firestore
-            result = self.collection.add(product_data)
+            # Add the product to Firestore under its deterministic document ID
+            # (create() fails rather than overwrite if the ID is somehow taken)
+            doc_id = product_doc_id(product_data["productID"])
+            result = self.collection.document(doc_id).create(product_data)
+            if self.catalog is not None:
+                self.catalog.upsert(doc_id, product_data, product_version(result.update_time))
+            self._notify_change(product_data["productID"], "added")
             
             return {
                 "message": "Product added successfully.",
                 "productID": product_data["productID"],
-                "documentID": result[1].id
+                "documentID": doc_id
             }
             
         except Exception as e:
@@ -118,14 +709,13 @@ class InventoryService:
     def remove_product(self, product_id):
         """Remove a product from the inventory (soft delete only)."""
         try:
-            # Query the collection to find the product by product_id
-            product_ref = self.collection.where("productID", "==", product_id).stream()
-            
-            for doc in product_ref:
-                # Soft delete by setting availability to False
-                doc.reference.update({"availability": False})
-                return {"message": f"Product {product_id} removed from available inventory."}
-            
+            # Soft delete by setting availability to False (fails if the document does not exist)
+            result = self.collection.document(product_doc_id(product_id)).update({"availability": False})
+            if self.catalog is not None:
+                self.catalog.patch(product_id, {"availability": False}, product_version(result.update_time))
+            self._notify_change(product_id, "removed")
+            return {"message": f"Product {product_id} removed from available inventory."}
+        except NotFound:
             return {"error": "Product not found or unauthorized access."}
         except Exception as e:
             logging.debug(f"Error removing product: {str(e)}")
@@ -142,21 +732,33 @@ class InventoryService:
                 if field in update_data:
                     del update_data[field]
                     
-            product_ref = self.collection.where("productID", "==", product_id).where("userID", "==", user_id).stream()
-            
-            for doc in product_ref:
-                doc.reference.update(update_data)
-                return {"message": f"Product {product_id} updated successfully."}
-            
-            return {"error": "Product not found or unauthorized access."}
+            # Check ownership from memory when possible, otherwise with one document read
+            doc_ref = self.collection.document(product_doc_id(product_id))
+            if self.catalog is not None and self.catalog.is_fresh():
+                current = self.catalog.get(product_id)
+            else:
+                doc = doc_ref.get()
+                current = doc.to_dict() if doc.exists else None
+            if current is None or current.get("userID") != user_id:
+                return {"error": "Product not found or unauthorized access."}
+
+            result = doc_ref.update(update_data)
+            if self.catalog is not None:
+                self.catalog.patch(product_id, update_data, product_version(result.update_time))
+            self._notify_change(product_id, "updated")
+            return {"message": f"Product {product_id} updated successfully."}
         except Exception as e:
             logging.debug(f"Error updating product: {str(e)}")
             return {"error": str(e)}
         
 
 class InventoryConsumer:
-    def __init__(self, inventory_service):
+    def __init__(self, inventory_service, batch_size=None, flush_interval=None):
         self.inventory_service = inventory_service
+        # Messages prefetched and coalesced into one Firestore write; 1 handles messages one at a time
+        self.batch_size = min(batch_size or int(os.environ.get("INVENTORY_CONSUMER_BATCH_SIZE", 100)), MAX_CONSUMER_BATCH)
+        # Seconds to wait for a batch to fill before writing what has arrived
+        self.flush_interval = flush_interval or float(os.environ.get("INVENTORY_CONSUMER_FLUSH_INTERVAL", 0.5))
         # Use a distinct fixed queue name for Inventory service
         self.queue_name = "successful_transaction_inventory"
         self.routing_key = "transaction.successful"
@@ -183,23 +785,33 @@ class InventoryConsumer:
         # Declare the distinct fixed queue and bind it with the routing key
         self.channel.queue_declare(queue=self.queue_name, durable=True)
         self.channel.queue_bind(exchange='order_exchange', queue=self.queue_name, routing_key=self.routing_key)
+        self.channel.basic_qos(prefetch_count=self.batch_size)
 
 
     def callback(self, ch, method, properties, body):
-        """Callback function when a message is received."""
+        """
+        Callback function when a message is received. Invalid messages and
+        unknown products are rejected; messages that fail otherwise are requeued.
+        """
         try:
             message = json.loads(body)
             product_id = message.get("productID")
+        except (ValueError, AttributeError):
+            product_id = None
+        if not product_id:
+            logging.warning("Rejecting invalid message: missing productID")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
 
-            if not product_id:
-                logging.debug("Invalid message: Missing productID")
-                return
-
+        try:
             # Fetch the product
             product = self.inventory_service.get_product_by_id(product_id)
-            if "error" in product:
-                logging.debug(f"Product {product_id} not found.")
+            if product.get("error") == "Product not found.":
+                logging.warning(f"Rejecting message for unknown product {product_id}")
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
                 return
+            if "error" in product:
+                raise RuntimeError(product["error"])
 
             # Update inventory: Set availability to False
             self.inventory_service.update_product(product_id, product.get("userID"), {"availability": False})
@@ -211,10 +823,61 @@ class InventoryConsumer:
 
         except Exception as e:
             logging.debug(f"Error processing message: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+
+    def process_batch(self, batch):
+        """
+        Apply a batch of (delivery_tag, body) messages with one batched write.
+        Invalid messages are rejected; the rest are acked once the write commits,
+        or requeued if it fails.
+        """
+        orders = []
+        valid_tags = []
+        for delivery_tag, body in batch:
+            try:
+                message = json.loads(body)
+                product_id = message.get("productID")
+            except (ValueError, AttributeError):
+                product_id = None
+            if not product_id:
+                logging.debug("Invalid message: Missing productID, rejecting")
+                self.channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+                continue
+            orders.append((message.get("orderID"), product_id))
+            valid_tags.append(delivery_tag)
+
+        if not orders:
+            return
+        try:
+            updated = self.inventory_service.apply_successful_transactions(orders)
+            logging.debug(f"Applied {len(orders)} transaction(s): availability set to False for products {updated}")
+        except Exception as e:
+            logging.debug(f"Error applying batch of {len(orders)} transaction(s), requeueing: {e}")
+            # connection.sleep keeps servicing heartbeats while the consumer backs off
+            self.connection.sleep(1)
+            for delivery_tag in valid_tags:
+                self.channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+            return
+        for delivery_tag in valid_tags:
+            self.channel.basic_ack(delivery_tag=delivery_tag)
+
+    def consume_batches(self):
+        """Consume prefetched messages in batches of up to batch_size."""
+        batch = []
+        for method, properties, body in self.channel.consume(self.queue_name, inactivity_timeout=self.flush_interval):
+            if method is not None:
+                batch.append((method.delivery_tag, body))
+            # Flush when the batch is full or the queue has gone quiet
+            if batch and (method is None or len(batch) >= self.batch_size):
+                self.process_batch(batch)
+                batch = []
 
     def start_consuming(self):
         """Start consuming messages from RabbitMQ."""
         logging.debug("Waiting for messages...")
+        if self.batch_size > 1:
+            self.consume_batches()
+            return
         self.channel.basic_consume(queue=self.queue_name, on_message_callback=self.callback)
         self.channel.start_consuming()
 
@@ -226,27 +889,200 @@ class InventoryConsumer:
 
 # Create Flask application
 app = Flask(__name__)
-inventory_service = InventoryService()
+event_publisher = InventoryEventPublisher(RABBITMQ_HOST, EXCHANGE_NAME)
+catalog = ProductCatalog(db.collection("inventory-db"))
+catalog.start()
+inventory_service = InventoryService(event_publisher, catalog)
 consumer = InventoryConsumer(inventory_service)
 
 consumer.run()
 
+def not_modified(etag):
+    """A 304 response if the request's If-None-Match matches etag, otherwise None."""
+    if etag is not None and request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        return cache_headers(response, etag)
+    return None
+
+def cache_headers(response, etag):
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = f"public, max-age={PRODUCT_CACHE_MAX_AGE}, must-revalidate"
+    return response
+
 # API endpoints
 @app.route('/inventory/products', methods=['GET'])
 def get_products():
-    """Get all available products"""
-    products = inventory_service.get_all_products()
-    logging.debug(f"Products API Response: {products}")  # Debugging logging.debug statement
-    response = make_response(jsonify(products))
+    """
+    Get products, streamed as JSON.
+
+    Query parameters (all optional):
+        limit: page size (capped at MAX_PAGE_SIZE)
+        after: cursor, the last productID of the previous page
+        availability: "true" or "false"
+
+    Without limit/after the full list is returned as a JSON array, as before.
+    With either, the response is {"products": [...], "nextCursor": <productID or null>}.
+    While the catalog is live the response carries an ETag, and a matching
+    If-None-Match gets a 304 without re-serializing the list.
+
+    The first page is read before the response starts, so a failing read is
+    still a 500 with {"error": ...}. If a later read fails the connection is
+    dropped, so the client sees a truncated body rather than a short list.
+    """
+    try:
+        limit = int(request.args["limit"]) if "limit" in request.args else None
+        after = int(request.args["after"]) if "after" in request.args else None
+    except ValueError:
+        return jsonify({"error": "limit and after must be integers"}), 400
+    availability = request.args.get("availability")
+    if availability is not None:
+        if availability.lower() not in ("true", "false"):
+            return jsonify({"error": "availability must be true or false"}), 400
+        availability = availability.lower() == "true"
+    if limit is not None and limit <= 0:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+
+    paginated = limit is not None or after is not None
+    if paginated:
+        limit = min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+
+    etag = None
+    listing_version = inventory_service.listing_version()
+    if listing_version is not None:
+        # Different query parameters produce different bodies, so they are part of the tag
+        etag = hashlib.sha1(f"{listing_version}|{request.query_string.decode()}".encode()).hexdigest()
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    products = inventory_service.iter_products(limit, after, availability)
+    try:
+        first_page = list(itertools.islice(products, limit or MAX_PAGE_SIZE))
+    except Exception as e:
+        logging.error(f"Error fetching products: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+    def generate():
+        count = 0
+        last_id = None
+        yield '{"products": [' if paginated else '['
+        try:
+            for product in itertools.chain(first_page, products):
+                yield (',' if count else '') + json.dumps(product)
+                count += 1
+                last_id = product["productID"]
+        except Exception as e:
+            # The status line has been sent: abort the response instead of closing the JSON normally
+            logging.error(f"Error streaming products after {count}: {str(e)}")
+            raise
+        if paginated:
+            next_cursor = last_id if count == limit else None
+            yield f'], "nextCursor": {json.dumps(next_cursor)}}}'
+        else:
+            yield ']'
+        logging.debug(f"Products API streamed {count} products")
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
     response.headers.add('Access-Control-Allow-Origin', '*')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-    return response
+    return cache_headers(response, etag)
 
 @app.route('/inventory/products/<int:product_id>', methods=['GET'])
 def get_product(product_id):
-    """Get a specific product by ID"""
-    return jsonify(inventory_service.get_product_by_id(product_id))
+    """Get a specific product by ID (ETag from the product's version; If-None-Match gets a 304)"""
+    product, version = inventory_service.get_product_versioned(product_id)
+    if version is None:
+        return jsonify(product)
+    etag = f"{product_id}-{version}"
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    return cache_headers(jsonify(product), etag)
+
+@app.route('/inventory/users/<int:user_id>/products', methods=['GET'])
+def get_user_products(user_id):
+    """Get all products listed by a user"""
+    result = inventory_service.get_products_by_user(user_id)
+    if "error" in result:
+        return jsonify(result), 500
+    return jsonify(result)
+
+@app.route('/inventory/search', methods=['GET'])
+def search_products():
+    """
+    Search products by name/description with numeric filters.
+
+    Query parameters (all optional):
+        q: search text (ranked by relevance; without it results are in productID order)
+        minPrice, maxPrice, minItemPrice, maxItemPrice, minCondition, maxCondition
+        availability: "true" or "false"
+        limit: page size (default DEFAULT_SEARCH_PAGE_SIZE, capped at MAX_PAGE_SIZE)
+        offset: number of results to skip
+    Returns: {"results": [...], "total": <matches>, "nextOffset": <offset or null>}
+    """
+    facet_params = {"price": ("minPrice", "maxPrice"),
+                    "itemPrice": ("minItemPrice", "maxItemPrice"),
+                    "conditionScore": ("minCondition", "maxCondition")}
+    ranges = {}
+    for field, (low_param, high_param) in facet_params.items():
+        low = request.args.get(low_param, type=float)
+        high = request.args.get(high_param, type=float)
+        if (request.args.get(low_param) and low is None) or (request.args.get(high_param) and high is None):
+            return jsonify({"error": f"{low_param}/{high_param} must be numbers"}), 400
+        if low is not None or high is not None:
+            ranges[field] = (low, high)
+
+    availability = request.args.get("availability")
+    if availability is not None:
+        if availability.lower() not in ("true", "false"):
+            return jsonify({"error": "availability must be true or false"}), 400
+        availability = availability.lower() == "true"
+
+    limit = request.args.get("limit", DEFAULT_SEARCH_PAGE_SIZE, type=int)
+    offset = request.args.get("offset", 0, type=int)
+    if limit <= 0 or offset < 0:
+        return jsonify({"error": "limit must be positive and offset non-negative"}), 400
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    result = inventory_service.search_products(request.args.get("q", ""), ranges, availability, limit, offset)
+    if result is None:
+        return jsonify({"error": "Search index is loading, try again shortly"}), 503
+    results, total = result
+    next_offset = offset + len(results) if offset + len(results) < total else None
+    return jsonify({"results": results, "total": total, "nextOffset": next_offset})
+
+@app.route('/inventory/products:batchGet', methods=['POST'])
+def batch_get_products():
+    """
+    Get many products in one call.
+    Body: {"productIDs": [1, 2, ...]} (at most MAX_BATCH_GET IDs)
+    Returns: {"products": {"<productID>": {...}}, "missing": [<productID>, ...]}
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    product_ids = body.get("productIDs")
+    # bool is a subclass of int, so true/false would otherwise pass as IDs
+    if not isinstance(product_ids, list) or not all(isinstance(pid, int) and not isinstance(pid, bool)
+                                                    for pid in product_ids):
+        return jsonify({"error": "productIDs must be a list of integers"}), 400
+    if len(product_ids) > MAX_BATCH_GET:
+        return jsonify({"error": f"At most {MAX_BATCH_GET} productIDs per request"}), 400
+
+    try:
+        products, missing = inventory_service.get_products_by_ids(product_ids)
+    except Exception as e:
+        logging.debug(f"Error in batchGet: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "products": {str(product_id): product for product_id, product in products.items()},
+        "missing": missing
+    })
 
 @app.route('/inventory/products', methods=['POST'])
 def add_product():
@@ -0,0 +1,70 @@
+"""
+One-shot migration: re-key inventory-db documents by productID.
+
+Products used to be stored under random document IDs from collection.add(),
+so every read and update had to query by productID. inventory.py now
+addresses products directly as document(str(productID)). This script copies
+every product whose document ID does not match its productID to the
+deterministic ID and deletes the old document, in batched writes.
+
+Run it once, with the inventory service stopped, from this directory:
+    python migrate_product_doc_ids.py --dry-run
+    python migrate_product_doc_ids.py
+"""
+import argparse
+import sys
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+COLLECTION_NAME = "inventory-db"
+BATCH_SIZE = 250  # two writes per product; Firestore batches hold at most 500
+
+
+def migrate(db, dry_run=False):
+    collection = db.collection(COLLECTION_NAME)
+    docs = list(collection.stream())
+    existing_ids = {doc.id for doc in docs}
+
+    moves = []
+    claimed = set()
+    for doc in docs:
+        data = doc.to_dict()
+        product_id = data.get("productID")
+        if product_id is None:
+            print(f"⚠️ Skipping {doc.id}: no productID")
+            continue
+        target_id = str(product_id)
+        if doc.id == target_id:
+            continue
+        if target_id in existing_ids or target_id in claimed:
+            print(f"❌ Conflict: {doc.id} has productID {product_id} but document {target_id} already exists; skipping")
+            continue
+        claimed.add(target_id)
+        moves.append((doc, target_id, data))
+
+    print(f"🔍 {len(docs)} products, {len(moves)} to migrate")
+    if dry_run:
+        for doc, target_id, _ in moves:
+            print(f"  {doc.id} -> {target_id}")
+        return len(moves)
+
+    for start in range(0, len(moves), BATCH_SIZE):
+        batch = db.batch()
+        for doc, target_id, data in moves[start:start + BATCH_SIZE]:
+            batch.create(collection.document(target_id), data)
+            batch.delete(doc.reference)
+        batch.commit()
+        print(f"✅ Migrated {min(start + BATCH_SIZE, len(moves))}/{len(moves)}")
+    return len(moves)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="list the documents that would move without writing")
+    parser.add_argument("--credentials", default="serviceAccountKey.json", help="Firebase service account key")
+    args = parser.parse_args()
+
+    firebase_admin.initialize_app(credentials.Certificate(args.credentials))
+    migrate(firestore.client(), dry_run=args.dry_run)
+    sys.exit(0)
@@ -0,0 +1,119 @@
+"""
+Concurrent product creation against the Firestore emulator.
+
+Several InventoryService instances (one per simulated process, each with its
+own ProductIDAllocator) add thousands of products from many threads. Every
+product must be stored under its own productID with no create() conflicts,
+and the leased ID blocks must tile one contiguous range.
+
+Skipped unless FIRESTORE_EMULATOR_HOST is set, e.g.
+    gcloud emulators firestore start --host-port=localhost:8080
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m pytest tests
+"""
+import os
+import sys
+import threading
+import uuid
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytestmark = pytest.mark.skipif(not os.environ.get("FIRESTORE_EMULATOR_HOST"),
+                                reason="needs the Firestore emulator (FIRESTORE_EMULATOR_HOST)")
+
+SERVICES = 5              # one per simulated process
+THREADS_PER_SERVICE = 8
+PRODUCTS_PER_THREAD = 100  # 4000 products in total
+BLOCK_SIZE = 20
+
+
+@pytest.fixture(scope="module")
+def inventory():
+    from google.cloud import firestore as cloud_firestore
+
+    # A fresh emulator project per run, so inventory-db and the ID counter start empty
+    emulator_db = cloud_firestore.Client(project=f"demo-inventory-{uuid.uuid4().hex[:8]}")
+    # The module connects to Firebase and RabbitMQ at import time
+    with mock.patch("firebase_admin.credentials.Certificate"), \
+            mock.patch("firebase_admin.initialize_app"), \
+            mock.patch("firebase_admin.firestore.client", return_value=emulator_db), \
+            mock.patch("pika.BlockingConnection"):
+        import inventory
+    return inventory
+
+
+def sample_product(user_id):
+    return {
+        "productName": "Test product", "productDesc": "Created by the allocator test", "price": 5.0,
+        "itemPrice": 50.0, "userID": user_id, "length": 1, "width": 1, "height": 1, "weight": 1,
+        "distanceUnit": "in", "massUnit": "lb", "conditionScore": 100, "originalImageUrl": "",
+    }
+
+
+def test_concurrent_add_product_has_no_collisions(inventory):
+    results = []  # (service index, add_product result)
+    leases = []   # (service index, start, end)
+    lock = threading.Lock()
+
+    def make_service(index):
+        # No catalog or event publisher: every read and write goes to Firestore
+        service = inventory.InventoryService()
+        allocator = service.id_allocator
+        allocator.block_size = BLOCK_SIZE
+        lease_block = allocator._lease_block
+
+        def recording_lease_block():
+            start, end = lease_block()
+            with lock:
+                leases.append((index, start, end))
+            return start, end
+
+        allocator._lease_block = recording_lease_block
+        return service
+
+    def worker(index, service):
+        for _ in range(PRODUCTS_PER_THREAD):
+            result = service.add_product(sample_product(user_id=index))
+            with lock:
+                results.append((index, result))
+
+    threads = []
+    for index in range(SERVICES):
+        service = make_service(index)
+        threads += [threading.Thread(target=worker, args=(index, service)) for _ in range(THREADS_PER_SERVICE)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    total = SERVICES * THREADS_PER_SERVICE * PRODUCTS_PER_THREAD
+    errors = [result["error"] for _, result in results if "error" in result]
+    assert not errors, f"{len(errors)} add_product failures, e.g. {errors[0]}"
+    assert len(results) == total
+
+    # Every product is stored once, under its own productID
+    docs = {doc.id: doc.to_dict() for doc in inventory.db.collection("inventory-db").stream()}
+    assert len(docs) == total
+    assert all(doc_id == str(data["productID"]) for doc_id, data in docs.items())
+    allocated = [(index, result["productID"]) for index, result in results]
+    assert sorted(str(pid) for _, pid in allocated) == sorted(docs)
+
+    # Leases never overlap and together cover a contiguous range from the seed
+    ranges = sorted((start, end) for _, start, end in leases)
+    assert ranges[0][0] == 1
+    assert all(end - start == BLOCK_SIZE for start, end in ranges)
+    assert all(prev_end == start for (_, prev_end), (start, _) in zip(ranges, ranges[1:]))
+
+    # Within each lease a service hands out IDs contiguously from the start of the block
+    for index, start, end in leases:
+        in_lease = sorted(pid for owner, pid in allocated if start <= pid < end)
+        assert all(owner == index for owner, pid in allocated if start <= pid < end)
+        assert in_lease == list(range(start, start + len(in_lease)))
+
+    # Only a service's most recent lease can be partly used
+    for index in range(SERVICES):
+        own = sorted((start, end) for owner, start, end in leases if owner == index)
+        for start, end in own[:-1]:
+            assert sum(1 for owner, pid in allocated if owner == index and start <= pid < end) == BLOCK_SIZE
@@ -4,6 +4,8 @@ import requests
 import threading
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
+from product_cache import ProductCache
+from service_client import ServiceClient
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,6 +16,27 @@ app = Flask(__name__)
 USER_SERVICE_BASE_URL = os.getenv("USER_SERVICE_BASE_URL")  # e.g., https://personal-s5llcxwn.outsystemscloud.com/userMS/rest/user
 INVENTORY_SERVICE_API = os.getenv("INVENTORY_SERVICE_API", "http://inventory-app:5020")
 TRANSACTION_SERVICE_BASE_URL = os.getenv("TRANSACTION_SERVICE_BASE_URL", "http://transaction-service:5003")
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq")
+EXCHANGE_NAME = os.getenv("EXCHANGE_NAME", "order_exchange")
+
+# Pooled HTTP clients, one per downstream, with per-service timeouts
+user_client = ServiceClient("user", connect_timeout=5, read_timeout=15)  # OutSystems, over the WAN
+inventory_client = ServiceClient("inventory", read_timeout=5)
+transaction_client = ServiceClient("transaction", read_timeout=30)  # Stripe charges can be slow
+
+def fetch_product(product_id):
+    """Product cache loader: GET {INVENTORY_SERVICE_API}/inventory/products/{productID}"""
+    inventory_url = f"{INVENTORY_SERVICE_API}/inventory/products/{product_id}"
+    inv_resp = inventory_client.get(inventory_url)
+    inv_resp.raise_for_status()
+    inv_data = inv_resp.json()
+    if "error" in inv_data:
+        return None
+    return inv_data
+
+# Product details cache, invalidated by inventory.changed events
+product_cache = ProductCache(fetch_product, RABBITMQ_HOST, exchange=EXCHANGE_NAME)
+product_cache.start()
 
 @app.route('/lateCharge', methods=['POST'])
 def handle_late_charge():
@@ -32,7 +55,8 @@ def handle_late_charge():
          GET {USER_SERVICE_BASE_URL}/getUserScore/?id={userID}
       2. Retrieve product details from the Inventory service:
          GET {INVENTORY_SERVICE_API}/inventory/products/{productID}
-         to obtain "price" and "productName".
+         to obtain "price" and "productName" (served from the product cache
+         when the product has not changed since it was last fetched).
       3. If overdue14 is true, use the retrieved "price" for calculation;
          otherwise, use the provided "dailyPayment".
       4. Calculate lateCharge = round((value * 100) / userScore, 2)
@@ -67,18 +91,15 @@ def handle_late_charge():
         
         # Retrieve userScore from the User service
         user_url = f"{USER_SERVICE_BASE_URL}/getUserScore/?id={user_id}"
-        user_resp = requests.get(user_url, timeout=10)
+        user_resp = user_client.get(user_url)
         user_resp.raise_for_status()
         user_data = user_resp.json()
         user_score = user_data.get("userScore")
         if not user_score:
             return jsonify({"error": "Invalid userScore received"}), 500
 
-        # Always retrieve product details from Inventory service
-        inventory_url = f"{INVENTORY_SERVICE_API}/inventory/products/{product_id}"
-        inv_resp = requests.get(inventory_url, timeout=10)
-        inv_resp.raise_for_status()
-        inv_data = inv_resp.json()
+        # Retrieve product details from Inventory service (through the product cache)
+        inv_data = product_cache.get(product_id) or {}
         product_name = inv_data.get("productName")
         price = inv_data.get("price")
         if price is None or not product_name:
@@ -123,7 +144,7 @@ def process_transaction(user_id, late_charge):
 
         transaction_url = f"{TRANSACTION_SERVICE_BASE_URL}/transaction/purchase"
         # Fire-and-forget POST request; no response handling.
-        requests.post(transaction_url, json=transaction_payload, timeout=10)
+        transaction_client.post(transaction_url, json=transaction_payload)
     except Exception:
         pass  # Silently ignore background errors
 
@@ -0,0 +1,158 @@
+"""
+Pooled HTTP client for calls to downstream services.
+
+Each ServiceClient wraps one requests.Session per downstream so TCP/TLS
+connections are kept alive and reused across calls, applies connect/read
+timeouts to every request, retries idempotent requests on connection errors
+and 5xx responses with jittered exponential backoff, and trips a circuit
+breaker after repeated failures so a dead downstream fails fast instead of
+tying up request threads.
+
+Identical copies of this module ship with every service that uses it
+(order_composite, late_charge_microservice, check_expiry_microservice,
+report_damage_composite_microservice, conditionchecking_microservice).
+"""
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Only safe methods are retried by default: several PUT endpoints downstream
+# (e.g. updateUserScore) apply relative changes and must not be replayed.
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a downstream whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker. After failure_threshold failures in a
+    row the circuit opens for reset_timeout seconds, then lets a single trial
+    request through (half-open): success closes it, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+
+class ServiceClient:
+    def __init__(self, name, connect_timeout=3.05, read_timeout=10, retries=2, backoff=0.2,
+                 pool_size=20, failure_threshold=5, reset_timeout=30, retry_methods=IDEMPOTENT_METHODS):
+        """
+        Args:
+            name: Downstream name, used in logs
+            connect_timeout: Seconds to wait for the TCP/TLS connection
+            read_timeout: Seconds to wait for the response
+            retries: Extra attempts for requests whose method is in retry_methods
+            backoff: Base delay in seconds; attempt n sleeps up to backoff * 2**n
+            pool_size: Maximum pooled keep-alive connections per host
+        """
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_methods = retry_methods
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the pooled session; same arguments and return value as requests.request."""
+        method = method.upper()
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self.name}, not calling {url}")
+
+        kwargs.setdefault("timeout", self.timeout)
+        attempts = self.retries + 1 if method in self.retry_methods else 1
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                logger.warning(f"{self.name}: {method} {url} failed (attempt {attempt + 1}/{attempts}): {e}")
+                if last_attempt:
+                    self.breaker.record_failure()
+                    raise
+                self._sleep(attempt)
+                continue
+            except Exception:
+                # Anything else (invalid URL, too many redirects, ...) is not retried, but still
+                # counts as a failure so a half-open trial always releases the breaker
+                self.breaker.record_failure()
+                raise
+
+            if response.status_code >= 500:
+                if not last_attempt:
+                    logger.warning(f"{self.name}: {method} {url} returned {response.status_code} (attempt {attempt + 1}/{attempts})")
+                    response.close()
+                    self._sleep(attempt)
+                    continue
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return response
+
+    def _sleep(self, attempt):
+        # Full jitter so retries from concurrent callers do not synchronise
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
@@ -0,0 +1,77 @@
+"""
+Measure order event publishes per second against a running RabbitMQ.
+
+"before" is the old publish path: a new BlockingConnection per message that
+declares the exchange, enables confirms, publishes and closes. "after" is the
+shared OrderEventPipeline every publish site now uses, timed until the broker
+has confirmed every message. Run it from this directory:
+    python bench_publish.py --messages 2000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import pika
+from dotenv import load_dotenv
+
+load_dotenv("local.env")
+
+from order_composite import OrderEventPipeline, exchange_name, rabbitmq_host
+
+ROUTING_KEY = "bench.order_events"  # bound to no queue, so nothing consumes the messages
+
+
+def sample_body(i):
+    return json.dumps({"orderID": i, "userID": 1, "productID": 1, "status": "paid", "paymentAmount": 10.0})
+
+
+def bench_connection_per_publish(host, exchange, messages):
+    start = time.perf_counter()
+    for i in range(messages):
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=host))
+        channel = connection.channel()
+        channel.exchange_declare(exchange=exchange, exchange_type='topic', durable=True)
+        channel.confirm_delivery()
+        channel.basic_publish(
+            exchange=exchange,
+            routing_key=ROUTING_KEY,
+            body=sample_body(i),
+            properties=pika.BasicProperties(delivery_mode=2, content_type='application/json')
+        )
+        connection.close()
+    return messages / (time.perf_counter() - start)
+
+
+def bench_pipeline(host, exchange, messages, batch_size):
+    spill_path = os.path.join(tempfile.mkdtemp(), "bench_spill.jsonl")
+    pipeline = OrderEventPipeline(host, exchange, spill_path=spill_path, batch_size=batch_size, builders=0)
+    pipeline.start()
+    # Get one message confirmed first so the connection handshake is not part of the timing
+    pipeline.publish(ROUTING_KEY, sample_body(-1))
+    deadline = time.monotonic() + 10
+    while pipeline.pending():
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Could not publish to RabbitMQ at {host}")
+        time.sleep(0.05)
+
+    start = time.perf_counter()
+    for i in range(messages):
+        pipeline.publish(ROUTING_KEY, sample_body(i))
+    while pipeline.pending():
+        time.sleep(0.001)
+    return messages / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000, help="messages to publish per run")
+    parser.add_argument("--batch-size", type=int, default=100, help="pipeline batch size")
+    parser.add_argument("--host", default=rabbitmq_host, help="RabbitMQ host (defaults to RABBITMQ_HOST)")
+    args = parser.parse_args()
+
+    before = bench_connection_per_publish(args.host, exchange_name, args.messages)
+    print(f"📊 connection per publish: {before:,.0f} publishes/sec")
+    after = bench_pipeline(args.host, exchange_name, args.messages, args.batch_size)
+    print(f"📊 OrderEventPipeline:     {after:,.0f} publishes/sec ({after / before:.1f}x)")
@@ -0,0 +1,114 @@
+"""
+Compare the sync (Flask) and async (Quart) order composite under the same load.
+
+Start both modes against the same downstream stack, e.g.
+    python order_composite.py                                          # port 5001
+    hypercorn order_composite_async:app --bind 0.0.0.0:5002
+then run, from this directory:
+    python compare_load.py --sync-url http://localhost:5001 --async-url http://localhost:5002
+
+Each mode gets --concurrency clients sending requests back to back for
+--duration seconds. The default request creates an order (POST /order_com/orders),
+so point it at a test stack; --path and --body select another endpoint.
+--id-range spreads productId/renterID/userID over that many values so the
+lookup caches keep missing; the report includes each mode's cache counters and
+lookup thread pool size from /order_com/cache/stats.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+import requests
+
+SAMPLE_ORDER = {
+    "price": 30.0,
+    "productId": 1,
+    "renterID": 1,
+    "userID": 2,
+    "startDate": "2030-01-01",
+    "endDate": "2030-01-04",
+}
+
+
+def make_body(template, id_range):
+    body = dict(template)
+    if id_range:
+        for field in ("productId", "renterID", "userID"):
+            if field in body:
+                body[field] = random.randint(1, id_range)
+    return body
+
+
+def run_load(url, body, concurrency, duration, id_range=None):
+    """Returns (latencies in ms of successful requests, error count)."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.post(url, json=make_body(body, id_range), timeout=60)
+                ok = response.status_code < 500
+            except requests.exceptions.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def cache_summary(base_url):
+    try:
+        stats = requests.get(base_url + "/order_com/cache/stats", timeout=10).json()
+    except (requests.exceptions.RequestException, ValueError):
+        return "cache stats unavailable"
+    caches = ", ".join(f"{name} {stats[name]['hits']} hits/{stats[name]['misses']} misses"
+                       for name in ("userInfo", "product") if name in stats)
+    return f"lookup threads {stats.get('lookupThreads', '?')}, {caches}"
+
+
+def report(name, latencies, errors, duration, base_url):
+    print(f"📊 {name:<6} {len(latencies) / duration:8.1f} req/s  "
+          f"p50 {percentile(latencies, 0.5):7.1f} ms  p99 {percentile(latencies, 0.99):7.1f} ms  "
+          f"errors {errors}  ({cache_summary(base_url)})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sync-url", default="http://localhost:5001", help="base URL of order_composite.py")
+    parser.add_argument("--async-url", default="http://localhost:5002", help="base URL of order_composite_async.py")
+    parser.add_argument("--path", default="/order_com/orders", help="endpoint to POST to")
+    parser.add_argument("--body", default=json.dumps(SAMPLE_ORDER), help="JSON request body")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load per mode")
+    parser.add_argument("--id-range", type=int, default=None,
+                        help="randomize productId/renterID/userID in 1..N to defeat the lookup caches")
+    args = parser.parse_args()
+
+    body = json.loads(args.body)
+    for name, base_url in (("sync", args.sync_url), ("async", args.async_url)):
+        base_url = base_url.rstrip("/")
+        latencies, errors = run_load(base_url + args.path, body, args.concurrency, args.duration, args.id_range)
+        report(name, latencies, errors, args.duration, base_url)
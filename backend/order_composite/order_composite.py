@@ -4,8 +4,15 @@ import requests
 import uuid
 import json
 import pika
+import time
+import queue
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from flask_cors import CORS
 from dotenv import load_dotenv
+from product_cache import ProductCache
+from service_client import ServiceClient, IDEMPOTENT_METHODS
 
 # Load environment variables from local.env if present.
 load_dotenv("local.env")
@@ -42,10 +49,122 @@ SHIPPING_SERVICE_URL = os.environ.get("SHIPPING_SERVICE_URL", "http://localhost:
 USER_INFO_URL = os.environ.get("USER_INFO_URL", "https://personal-s5llcxwn.outsystemscloud.com/userMS/rest/user/getUserInfo")
 STRIPE_CUSTOMER_URL = os.environ.get("STRIPE_CUSTOMER_URL", "https://personal-s5llcxwn.outsystemscloud.com/userMS/rest/user/getStripeCusID/")
 
+# Pooled HTTP clients, one per downstream, with per-service timeouts.
+# Order status PATCHes set an absolute value, so they are safe to retry.
+order_records_client = ServiceClient("order-records", read_timeout=10, retry_methods=IDEMPOTENT_METHODS | {"PATCH"})
+inventory_client = ServiceClient("inventory", read_timeout=5)
+user_client = ServiceClient("user", connect_timeout=5, read_timeout=15)  # OutSystems, over the WAN
+notification_client = ServiceClient("notification", read_timeout=15)
+transaction_client = ServiceClient("transaction", read_timeout=30)  # Stripe charges can be slow
+shipping_client = ServiceClient("shipping", read_timeout=15)
+
 # RabbitMQ connection details
 rabbitmq_host = os.environ.get("RABBITMQ_HOST", "localhost")
 exchange_name = os.environ.get("EXCHANGE_NAME", "order_exchange")
 
+# Bounded thread pool for the downstream lookups made while publishing order events
+LOOKUP_POOL_SIZE = int(os.environ.get("LOOKUP_POOL_SIZE", 8))
+lookup_executor = ThreadPoolExecutor(max_workers=LOOKUP_POOL_SIZE, thread_name_prefix="lookup")
+
+class NotFound(Exception):
+    """Raised by a cache loader when the upstream reports the key does not exist."""
+
+
+class ReadThroughCache:
+    """
+    Thread-safe read-through cache with TTL expiry, an LRU size bound, negative
+    caching of NotFound results and single-flight loading: concurrent misses for
+    the same key wait on one upstream request instead of each issuing their own.
+    """
+
+    def __init__(self, name, loader, ttl, max_size, negative_ttl):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self._entries = collections.OrderedDict()  # key -> (value, found, expires_at)
+        self._in_flight = {}                       # key -> Future of the running load
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "negativeHits": 0, "misses": 0, "coalesced": 0,
+                       "loadErrors": 0, "evictions": 0}
+
+    def get(self, key):
+        """Return the cached or freshly loaded value; None if not found or the load failed."""
+        key = str(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats["hits" if entry[1] else "negativeHits"] += 1
+                return entry[0]
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                owner = False
+            else:
+                self._stats["misses"] += 1
+                future = self._in_flight[key] = Future()
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        value = None
+        try:
+            value = self.loader(key)
+            self._store(key, value, True, self.ttl)
+        except NotFound:
+            self._store(key, None, False, self.negative_ttl)
+        except Exception as e:
+            with self._lock:
+                self._stats["loadErrors"] += 1
+            print(f"❌ {self.name} cache load failed for {key}: {str(e)[:100]}")
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_result(value)
+        return value
+
+    def _store(self, key, value, found, ttl):
+        with self._lock:
+            self._entries[key] = (value, found, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(str(key), None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), maxSize=self.max_size, ttlSeconds=self.ttl)
+
+
+def fetch_user_info(user_id):
+    """Cache loader: fetch the "details" block for a user from the user service."""
+    print(f"🔍 Getting user details from {USER_INFO_URL}?id={user_id}")
+    info_response = user_client.get(f"{USER_INFO_URL}?id={user_id}")
+    print(f"🔍 User API response status: {info_response.status_code}")
+    if info_response.status_code == 404:
+        raise NotFound(user_id)
+    if info_response.status_code != 200:
+        raise RuntimeError(f"Status {info_response.status_code} - {info_response.text[:100]}")
+    return info_response.json().get("details", {})
+
+
+# Shared cache of OutSystems user info, keyed by user ID
+user_info_cache = ReadThroughCache(
+    "user-info",
+    fetch_user_info,
+    ttl=int(os.environ.get("USER_INFO_CACHE_TTL", 300)),
+    max_size=int(os.environ.get("USER_INFO_CACHE_SIZE", 10000)),
+    negative_ttl=int(os.environ.get("USER_INFO_CACHE_NEGATIVE_TTL", 30))
+)
+
+
 @app.route('/order_com/orders', methods=['POST'])
 def create_order():
     # Step 1: Get request data
@@ -80,7 +199,7 @@ def create_order():
         print(f"📤 Posting order #{order_id} to Order Records at {ORDER_RECORDS_URL}")
         print(f"🔍 Order data being sent: {order_response}")
         
-        records_response = requests.post(ORDER_RECORDS_URL, json=order_response)
+        records_response = order_records_client.post(ORDER_RECORDS_URL, json=order_response)
         
         print(f"📥 Response status code: {records_response.status_code}")
         print(f"📥 Response headers: {dict(records_response.headers)}")
@@ -110,34 +229,16 @@ def create_order():
         print(f"❌ Error details: {str(e)}")
 
     # Step 3: Get product details
-    try:
-        print(f"🔍 Getting details for product #{data['productId']}")
-        product_response = requests.get(f"{PRODUCT_DETAILS_URL}{data['productId']}")
-        product_data = product_response.json()
-        product_desc = product_data.get("productDesc", "")
-        original_image = product_data.get("originalImageUrl", "")
-        if product_response.status_code == 200:
-            print(f"✅ Product service: Retrieved details for product #{data['productId']}")
-        else:
-            print(f"❌ Product service failed: Status {product_response.status_code}")
-    except Exception as e:
-        print(f"❌ Product service connection error: {str(e)[:100]}")
-        product_desc = ""
-        original_image = ""
+    product_data = get_product_details(data['productId']) or {}
+    product_desc = product_data.get("productDesc", "")
+    original_image = product_data.get("originalImageUrl", "")
         
     # Step 3.5: Get user email
-    user_email = ""
-    try:
-        print(f"👤 Getting email for user #{data['renterID']}")
-        user_response = requests.get(f"{USER_EMAIL_URL}?id={data['renterID']}")
-        if user_response.status_code == 200:
-            user_data = user_response.json()
-            user_email = user_data.get("email", "")
-            print(f"✅ User service: Retrieved email for user #{data['renterID']}, email:{user_email}")
-        else:
-            print(f"❌ User service failed: Status {user_response.status_code} - {user_response.text[:100]}")
-    except Exception as e:
-        print(f"❌ User service connection error: {str(e)[:100]}")
+    print(f"👤 Getting email for user #{data['renterID']}")
+    user_details = get_user_details(data['renterID'], "user")
+    user_email = user_details.get("email", "") if user_details else ""
+    if user_email:
+        print(f"✅ User service: Retrieved email for user #{data['renterID']}, email:{user_email}")
         
     # Step 4: Send notification to renter
     notification_data = {
@@ -150,7 +251,7 @@ def create_order():
     print(notification_data)
     try:
         print(f"📧 Sending notification for order #{order_id}")
-        notification_response = requests.post(
+        notification_response = notification_client.post(
             NOTIFICATION_URL, 
             json=notification_data
         )
@@ -166,241 +267,411 @@ def create_order():
     return jsonify(order_response), 201
 
 
-def publish_to_rabbitmq(transaction_status, message_data, order_id, user_id, product_id):
+def _timed(timings, step, fn, *args):
+    """Run fn(*args) and record its latency in milliseconds under timings[step]."""
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        timings[step] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def fetch_product(product_id):
+    """Product cache loader: fetch product details from the inventory service."""
+    print(f"🔍 Getting product details from {PRODUCT_DETAILS_URL}{product_id}")
+    product_response = inventory_client.get(f"{PRODUCT_DETAILS_URL}{product_id}")
+    print(f"🔍 Product API response status: {product_response.status_code}")
+    if product_response.status_code != 200:
+        raise RuntimeError(f"Status {product_response.status_code} - {product_response.text[:100]}")
+    product_data = product_response.json()
+    # The inventory service reports unknown products as {"error": ...}
+    if "error" in product_data:
+        return None
+    return product_data
+
+
+# Product details cache, invalidated by inventory.changed events
+product_cache = ProductCache(
+    fetch_product,
+    rabbitmq_host,
+    exchange=exchange_name,
+    ttl=int(os.environ.get("PRODUCT_CACHE_TTL", 300)),
+    max_size=int(os.environ.get("PRODUCT_CACHE_SIZE", 5000))
+)
+product_cache.start()
+
+
+def get_product_details(product_id):
+    """Fetch product details through the product cache. Returns None on failure."""
+    try:
+        product_data = product_cache.get(product_id)
+        if product_data is not None:
+            print(f"✅ Retrieved details for product #{product_id}")
+            return product_data
+        print(f"❌ Product #{product_id} not found")
+    except Exception as e:
+        print(f"❌ Error getting product details: {str(e)[:100]}")
+    return None
+
+
+def get_user_details(user_id, role):
+    """Fetch the "details" block for a user through the user info cache. Returns None on failure."""
+    details = user_info_cache.get(user_id)
+    if details is None:
+        print(f"❌ Failed to get {role} details for user #{user_id}")
+    else:
+        print(f"✅ Retrieved {role} details for user #{user_id}")
+    return details
+
+
+def get_product_and_renter_details(product_id, timings):
     """
-    Publish comprehensive message data to RabbitMQ with all required fields.
-    
+    Fetch the product, then the details of its owner (the renter).
+    Returns (product_data, renter_details); either may be None on failure.
+    """
+    product_data = _timed(timings, "product", get_product_details, product_id)
+    if product_data is None:
+        return None, None
+
+    renter_id = product_data.get("userID")
+    if not renter_id:
+        print(f"❌ No renter ID found in product data")
+        print(f"❌ Product data: {product_data}")
+        return product_data, None
+
+    renter_details = _timed(timings, "renter", get_user_details, renter_id, "renter")
+    return product_data, renter_details
+
+
+def build_order_message(message_data, order_id, user_id, product_id):
+    """
+    Enrich base transaction details with product, renter and user details.
+    Returns the complete message dict, or None if a lookup failed.
+
     Args:
-        transaction_status: Either "successful" or "unsuccessful"
         message_data: Base transaction details
         order_id: Order ID for the transaction
         user_id: User ID for the transaction (user who is renting the item)
         product_id: Product ID for the transaction
     """
-    print(f"🔄 Attempting to publish message to RabbitMQ for order {order_id}")
-    print(f"🔄 RabbitMQ host: {rabbitmq_host}, Exchange: {exchange_name}")
-    print(f"🔄 Transaction status: {transaction_status}")
-    
-    try:
-        # Get product details
-        product_data = {}
-        try:
-            print(f"🔍 Getting product details from {PRODUCT_DETAILS_URL}{product_id}")
-            product_response = requests.get(f"{PRODUCT_DETAILS_URL}{product_id}")
-            print(f"🔍 Product API response status: {product_response.status_code}")
-            
-            if product_response.status_code == 200:
-                product_data = product_response.json()
-                print(f"✅ Retrieved product details for message data")
-            else:
-                print(f"❌ Failed to get product details: Status {product_response.status_code}")
-                print(f"❌ Response text: {product_response.text[:100]}")
-                return False
-        except Exception as e:
-            print(f"❌ Error getting product details: {str(e)}")
-            return False
-
-        # Get renter (owner) details - the person who owns the item
-        renter_id = product_data.get("userID")
-        if not renter_id:
-            print(f"❌ No renter ID found in product data")
-            print(f"❌ Product data: {product_data}")
-            return False
-            
-        renter_details = {}
-        try:
-            print(f"🔍 Getting renter details from {USER_INFO_URL}?id={renter_id}")
-            renter_info_response = requests.get(f"{USER_INFO_URL}?id={renter_id}")
-            print(f"🔍 Renter API response status: {renter_info_response.status_code}")
-            
-            if renter_info_response.status_code == 200:
-                renter_data = renter_info_response.json()
-                renter_details = renter_data.get("details", {})
-                print(f"✅ Retrieved renter details for message data")
-            else:
-                print(f"❌ Failed to get renter details: Status {renter_info_response.status_code}")
-                print(f"❌ Response text: {renter_info_response.text[:100]}")
-                return False
-        except Exception as e:
-            print(f"❌ Error getting renter details: {str(e)}")
-            return False
+    # Fan out the lookups: the user lookup starts right away and overlaps
+    # with the product -> renter chain (the renter ID comes from the product).
+    timings = {}
+    lookup_start = time.perf_counter()
+    user_future = lookup_executor.submit(_timed, timings, "user", get_user_details, user_id, "user")
+    chain_future = lookup_executor.submit(get_product_and_renter_details, product_id, timings)
+    product_data, renter_details = chain_future.result()
+    user_details = user_future.result()
+    timings["total"] = round((time.perf_counter() - lookup_start) * 1000, 1)
+    print(f"⏱️ Lookup latency for order #{order_id} (ms): {timings}")
 
-        # Get user (recipient) details - the person renting the item
-        user_details = {}
-        try:
-            print(f"🔍 Getting user details from {USER_INFO_URL}?id={user_id}")
-            user_info_response = requests.get(f"{USER_INFO_URL}?id={user_id}")
-            print(f"🔍 User API response status: {user_info_response.status_code}")
-            
-            if user_info_response.status_code == 200:
-                user_data = user_info_response.json()
-                user_details = user_data.get("details", {})
-                print(f"✅ Retrieved user details for message data")
-            else:
-                print(f"❌ Failed to get user details: Status {user_info_response.status_code}")
-                print(f"❌ Response text: {user_info_response.text[:100]}")
-                return False
-        except Exception as e:
-            print(f"❌ Error getting user details: {str(e)}")
-            return False
+    if product_data is None or renter_details is None or user_details is None:
+        return None
+    renter_id = product_data.get("userID")
 
-        # Assemble complete message with all required fields
-        complete_message = {
-            # Core order data from message_data
-            "orderID": order_id,
-            "userID": user_id,
-            "productID": product_id,
-            "status": message_data.get("status"),
-            "paymentAmount": message_data.get("paymentAmount"),
-            "stripeCusID": message_data.get("stripeCusID"),
-            
-            # Add transaction ID if available
-            "transactionID": message_data.get("transactionID", ""),
-            
-            # Add error message if present
-            "error": message_data.get("error", ""),
-            
-            # Product details from product_data
-            "productName": product_data.get("productName", ""),
-            "productDesc": product_data.get("productDesc", ""),
-            "originalImage": product_data.get("originalImageUrl", ""),
-            "price": product_data.get("price", 0),
-            
-            # Product shipping details
-            "length": product_data.get("length", 0),
-            "width": product_data.get("width", 0),
-            "height": product_data.get("height", 0),
-            "weight": product_data.get("weight", 0),
-            "distanceUnit": product_data.get("distanceUnit", "in"),
-            "massUnit": product_data.get("massUnit", "lb"),
-            
-            # User (recipient) email and details
-            "userEmail": user_details.get("email", ""),
-            "recipientName": user_details.get("name", ""),
-            "recipientStreet": user_details.get("street1", ""),
-            "recipientCity": user_details.get("city", ""),
-            "recipientState": user_details.get("state", ""),
-            "recipientZip": user_details.get("zip", ""),
-            "recipientCountry": user_details.get("country", ""),
-            "recipientPhone": user_details.get("phoneNo", ""),
-            
-            # Renter (sender) details - the person who owns the item
-            "renterID": renter_id,
-            "senderName": renter_details.get("name", ""),
-            "senderStreet": renter_details.get("street1", ""),
-            "senderCity": renter_details.get("city", ""),
-            "senderState": renter_details.get("state", ""),
-            "senderZip": renter_details.get("zip", ""),
-            "senderCountry": renter_details.get("country", ""),
-            "senderPhone": renter_details.get("phoneNo", ""),
-            "senderEmail": renter_details.get("email", ""),
-            
-            
-        }
-
-        # DEBUG CODE 
-        print("=="*40)
-        print("DEBUG MESSAGE DATA CHECK:")
-        required_fields = [
-            "orderID", "userID", "productID", "productName", "productDesc", 
-            "length", "width", "height", "weight", "distanceUnit", "massUnit",
-            "userEmail", "recipientName", "recipientStreet", "recipientCity", 
-            "recipientState", "recipientZip", "recipientCountry",
-            "senderName", "senderStreet", "senderCity", "senderState", 
-            "senderZip", "senderCountry", "senderEmail"
-        ]
+    # Assemble complete message with all required fields
+    complete_message = {
+        # Core order data from message_data
+        "orderID": order_id,
+        "userID": user_id,
+        "productID": product_id,
+        "status": message_data.get("status"),
+        "paymentAmount": message_data.get("paymentAmount"),
+        "stripeCusID": message_data.get("stripeCusID"),
         
-        missing_fields = []
-        for field in required_fields:
-            if field not in complete_message or not complete_message.get(field):
-                missing_fields.append(field)
-                print(f"❌ MISSING REQUIRED FIELD: {field}")
-            else:
-                print(f"✅ Field {field} = {complete_message.get(field)}")
+        # Add transaction ID if available
+        "transactionID": message_data.get("transactionID", ""),
         
-        if missing_fields:
-            print(f"❌ TOTAL MISSING FIELDS: {len(missing_fields)} - {missing_fields}")
-        else:
-            print("✅ ALL REQUIRED FIELDS PRESENT")
+        # Add error message if present
+        "error": message_data.get("error", ""),
         
-        print("=="*40)
-        #DEBUG END
+        # Product details from product_data
+        "productName": product_data.get("productName", ""),
+        "productDesc": product_data.get("productDesc", ""),
+        "originalImage": product_data.get("originalImageUrl", ""),
+        "price": product_data.get("price", 0),
         
-        # Connect to RabbitMQ with more detailed error reporting
-        try:
-            print(f"🔌 Connecting to RabbitMQ at host: {rabbitmq_host}")
-            connection_params = pika.ConnectionParameters(
-                host=rabbitmq_host,
-                connection_attempts=3,
-                retry_delay=1,
-                socket_timeout=5
+        # Product shipping details
+        "length": product_data.get("length", 0),
+        "width": product_data.get("width", 0),
+        "height": product_data.get("height", 0),
+        "weight": product_data.get("weight", 0),
+        "distanceUnit": product_data.get("distanceUnit", "in"),
+        "massUnit": product_data.get("massUnit", "lb"),
+        
+        # User (recipient) email and details
+        "userEmail": user_details.get("email", ""),
+        "recipientName": user_details.get("name", ""),
+        "recipientStreet": user_details.get("street1", ""),
+        "recipientCity": user_details.get("city", ""),
+        "recipientState": user_details.get("state", ""),
+        "recipientZip": user_details.get("zip", ""),
+        "recipientCountry": user_details.get("country", ""),
+        "recipientPhone": user_details.get("phoneNo", ""),
+        
+        # Renter (sender) details - the person who owns the item
+        "renterID": renter_id,
+        "senderName": renter_details.get("name", ""),
+        "senderStreet": renter_details.get("street1", ""),
+        "senderCity": renter_details.get("city", ""),
+        "senderState": renter_details.get("state", ""),
+        "senderZip": renter_details.get("zip", ""),
+        "senderCountry": renter_details.get("country", ""),
+        "senderPhone": renter_details.get("phoneNo", ""),
+        "senderEmail": renter_details.get("email", ""),
+        
+        
+    }
+
+    # DEBUG CODE 
+    print("=="*40)
+    print("DEBUG MESSAGE DATA CHECK:")
+    required_fields = [
+        "orderID", "userID", "productID", "productName", "productDesc", 
+        "length", "width", "height", "weight", "distanceUnit", "massUnit",
+        "userEmail", "recipientName", "recipientStreet", "recipientCity", 
+        "recipientState", "recipientZip", "recipientCountry",
+        "senderName", "senderStreet", "senderCity", "senderState", 
+        "senderZip", "senderCountry", "senderEmail"
+    ]
+    
+    missing_fields = []
+    for field in required_fields:
+        if field not in complete_message or not complete_message.get(field):
+            missing_fields.append(field)
+            print(f"❌ MISSING REQUIRED FIELD: {field}")
+        else:
+            print(f"✅ Field {field} = {complete_message.get(field)}")
+    
+    if missing_fields:
+        print(f"❌ TOTAL MISSING FIELDS: {len(missing_fields)} - {missing_fields}")
+    else:
+        print("✅ ALL REQUIRED FIELDS PRESENT")
+    
+    print("=="*40)
+    #DEBUG END
+
+    return complete_message
+
+
+class OrderEventPipeline:
+    """
+    Asynchronous publish pipeline for transaction.* order events.
+
+    submit() only enqueues the event, so HTTP handlers return without waiting on
+    the broker. Builder threads enrich queued events via build_order_message and
+    hand them to a single AMQP thread running a pika SelectConnection, which
+    publishes in batches and tracks asynchronous publisher confirms. Nacked or
+    unconfirmed messages are retried; while the broker is unreachable pending
+    messages are spilled to a size-bounded JSON-lines file and replayed on reconnect.
+    """
+
+    def __init__(self, host, exchange, spill_path, spill_max_bytes=50 * 1024 * 1024,
+                 batch_size=100, max_in_flight=1000, flush_interval=0.05, builders=2):
+        self.host = host
+        self.exchange = exchange
+        self.spill_path = spill_path
+        self.spill_max_bytes = spill_max_bytes
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.flush_interval = flush_interval
+        self.builders = builders
+
+        self._events = queue.Queue()        # raw events waiting to be enriched
+        self._outbox = queue.Queue()        # (routing_key, body) ready to publish
+        self._retry = collections.deque()   # nacked/unconfirmed messages, published first
+        self._unconfirmed = {}              # delivery tag -> (routing_key, body)
+        self._delivery_tag = 0
+        self._connection = None
+        self._channel = None
+
+    def start(self):
+        for i in range(self.builders):
+            builder_thread = threading.Thread(target=self._build_loop, name=f"order-events-builder-{i}")
+            builder_thread.daemon = True
+            builder_thread.start()
+        amqp_thread = threading.Thread(target=self._run, name="order-events-amqp")
+        amqp_thread.daemon = True
+        amqp_thread.start()
+
+    def submit(self, transaction_status, message_data, order_id, user_id, product_id):
+        """Queue an order event for publishing and return immediately."""
+        self._events.put((transaction_status, message_data, order_id, user_id, product_id))
+        print(f"📥 Queued transaction.{transaction_status} event for order #{order_id}")
+
+    def publish(self, routing_key, body):
+        """Queue an already built message body for publishing."""
+        self._outbox.put((routing_key, body))
+
+    def pending(self):
+        """Number of messages not yet confirmed by the broker (excluding spilled ones)."""
+        return self._events.qsize() + self._outbox.qsize() + len(self._retry) + len(self._unconfirmed)
+
+    def _build_loop(self):
+        while True:
+            transaction_status, message_data, order_id, user_id, product_id = self._events.get()
+            try:
+                complete_message = build_order_message(message_data, order_id, user_id, product_id)
+                if complete_message is None:
+                    print(f"❌ Dropping transaction.{transaction_status} event for order #{order_id}: lookups failed")
+                    continue
+                self.publish(f"transaction.{transaction_status}", json.dumps(complete_message))
+            except Exception as e:
+                print(f"❌ Failed to build event for order #{order_id}: {str(e)}")
+
+    # --- AMQP thread -----------------------------------------------------
+
+    def _run(self):
+        """Own the SelectConnection; reconnect with a delay whenever it drops."""
+        while True:
+            try:
+                self._connection = pika.SelectConnection(
+                    pika.ConnectionParameters(host=self.host, heartbeat=60),
+                    on_open_callback=self._on_connection_open,
+                    on_open_error_callback=self._on_connection_open_error,
+                    on_close_callback=self._on_connection_closed
+                )
+                self._connection.ioloop.start()
+            except Exception as e:
+                print(f"❌ Order event publisher error: {str(e)}")
+            self._channel = None
+            self._requeue_unconfirmed()
+            self._spill_pending()
+            time.sleep(3)
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_open_error(self, connection, error):
+        print(f"❌ Order event publisher could not connect to RabbitMQ: {error!r}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        print(f"❌ Order event publisher connection closed: {reason!r}")
+        self._channel = None
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        self._channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.exchange_declare(
+            exchange=self.exchange,
+            exchange_type='topic',
+            durable=True,
+            callback=lambda _frame: channel.confirm_delivery(
+                ack_nack_callback=self._on_delivery_confirmation,
+                callback=self._on_confirm_select_ok
             )
-            connection = pika.BlockingConnection(connection_params)
-            print(f"✅ Connected to RabbitMQ")
-            
-            channel = connection.channel()
-            print(f"✅ Channel created")
-            
-            # Verify exchange exists (or create it)
-            channel.exchange_declare(
-                exchange=exchange_name, 
-                exchange_type='topic',
-                durable=True
+        )
+
+    def _on_channel_closed(self, channel, reason):
+        print(f"❌ Order event publisher channel closed: {reason!r}")
+        self._channel = None
+        if self._connection.is_open:
+            self._connection.close()
+
+    def _on_confirm_select_ok(self, _frame):
+        print(f"✅ Order event publisher ready on exchange '{self.exchange}'")
+        self._delivery_tag = 0
+        self._replay_spill()
+        self._flush()
+
+    def _on_delivery_confirmation(self, method_frame):
+        method = method_frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        if method.multiple:
+            tags = [tag for tag in self._unconfirmed if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        for tag in tags:
+            message = self._unconfirmed.pop(tag, None)
+            if message is not None and not acked:
+                self._retry.append(message)
+        if not acked:
+            print(f"❌ Broker nacked {len(tags)} order event(s); scheduled for retry")
+
+    def _flush(self):
+        """Publish the next batch, then reschedule itself on the ioloop."""
+        if self._channel is None or not self._channel.is_open:
+            return
+        published = 0
+        while published < self.batch_size and len(self._unconfirmed) < self.max_in_flight:
+            if self._retry:
+                message = self._retry.popleft()
+            else:
+                try:
+                    message = self._outbox.get_nowait()
+                except queue.Empty:
+                    break
+            routing_key, body = message
+            self._channel.basic_publish(
+                exchange=self.exchange,
+                routing_key=routing_key,
+                body=body,
+                properties=pika.BasicProperties(
+                    delivery_mode=2,  # make message persistent
+                    content_type='application/json'
+                )
             )
-            print(f"✅ Exchange '{exchange_name}' verified/created")
-            
-            # Define the routing key based on status
-            routing_key = f"transaction.{transaction_status}"
-            print(f"📤 Publishing message with routing key: {routing_key}")
+            self._delivery_tag += 1
+            self._unconfirmed[self._delivery_tag] = message
+            published += 1
+        if published:
+            print(f"📤 Published batch of {published} order event(s), {len(self._unconfirmed)} awaiting confirm")
+        self._connection.ioloop.call_later(self.flush_interval, self._flush)
 
-            # Enable publisher confirms
-            channel.confirm_delivery()
-            print(f"✅ Publisher confirms enabled")
-            
-            # Publish the message with more logging
+    def _requeue_unconfirmed(self):
+        for tag in sorted(self._unconfirmed):
+            self._retry.append(self._unconfirmed[tag])
+        self._unconfirmed.clear()
+
+    # --- spill file (only touched from the AMQP thread) ------------------
+
+    def _spill_pending(self):
+        """Move everything waiting to be published to the spill file."""
+        pending = list(self._retry)
+        self._retry.clear()
+        while True:
             try:
-                print(f"📤 Attempting to publish message...")
-                was_published = channel.basic_publish(
-                    exchange=exchange_name,
-                    routing_key=routing_key,
-                    body=json.dumps(complete_message),
-                    properties=pika.BasicProperties(
-                        delivery_mode=2,  # make message persistent
-                        content_type='application/json'
-                    )
-                )
-                
-                if was_published:
-                    print(f"✅ Message for order #{order_id} CONFIRMED delivered to RabbitMQ")
-                else:
-                    print(f"❌ Message for order #{order_id} FAILED to deliver to RabbitMQ")
-                    
-                # Close connection properly
-                connection.close()
-                print(f"✅ RabbitMQ connection closed")
-                
-                return was_published
-                
-            except pika.exceptions.UnroutableError:
-                print(f"❌ Message for order #{order_id} was returned as unroutable")
-                print(f"❌ This usually means there are no bindings matching routing key '{routing_key}'")
-                connection.close()
-                return False
-                
-        except pika.exceptions.AMQPConnectionError as conn_error:
-            print(f"❌ AMQP Connection Error: {str(conn_error)}")
-            print("❌ Check that RabbitMQ service is running and accessible")
-            return False
-            
-        except pika.exceptions.ChannelError as channel_error:
-            print(f"❌ Channel Error: {str(channel_error)}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Failed to publish RabbitMQ message: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        return False
+                pending.append(self._outbox.get_nowait())
+            except queue.Empty:
+                break
+        if not pending:
+            return
+        size = os.path.getsize(self.spill_path) if os.path.exists(self.spill_path) else 0
+        written = 0
+        with open(self.spill_path, "a") as spill_file:
+            for routing_key, body in pending:
+                line = json.dumps({"routingKey": routing_key, "body": body}) + "\n"
+                if size + len(line) > self.spill_max_bytes:
+                    break
+                spill_file.write(line)
+                size += len(line)
+                written += 1
+        print(f"💾 Spilled {written} order event(s) to {self.spill_path}")
+        if written < len(pending):
+            print(f"❌ Spill file full: dropped {len(pending) - written} order event(s)")
+
+    def _replay_spill(self):
+        if not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path) as spill_file:
+            for line in spill_file:
+                if line.strip():
+                    record = json.loads(line)
+                    self._retry.append((record["routingKey"], record["body"]))
+        os.remove(self.spill_path)
+        print(f"🔁 Replaying {len(self._retry)} spilled order event(s)")
+
+
+order_events = OrderEventPipeline(
+    rabbitmq_host,
+    exchange_name,
+    spill_path=os.environ.get("ORDER_EVENTS_SPILL_PATH", "order_events_spill.jsonl"),
+    spill_max_bytes=int(os.environ.get("ORDER_EVENTS_SPILL_MAX_BYTES", 50 * 1024 * 1024)),
+    batch_size=int(os.environ.get("ORDER_EVENTS_BATCH_SIZE", 100))
+)
+order_events.start()
 
 
 @app.route('/order_com/confirm/<string:order_id>', methods=['POST'])
@@ -417,7 +688,7 @@ def confirm_order(order_id):
             order_url = f"{ORDER_RECORDS_URL}/{order_id}"
             print(f"🔄 Updating order #{order_id} status to 'accepted'")
             #Update order status in order records
-            update_response = requests.patch(order_url, json=update_data)
+            update_response = order_records_client.patch(order_url, json=update_data)
             
             if update_response.status_code == 404:
                 print(f"❌ Order #{order_id} not found")
@@ -455,7 +726,7 @@ def confirm_order(order_id):
             variables = {"orderID": order_id}
             graphql_payload = {"query": query, "variables": variables}
             #retrive order details 
-            order_response = requests.post(ORDER_RECORDS_URL_GRAPHQL, json=graphql_payload)
+            order_response = order_records_client.post(ORDER_RECORDS_URL_GRAPHQL, json=graphql_payload)
             
             if order_response.status_code != 200:
                 error_msg = f"Status {order_response.status_code} - {order_response.text[:100]}"
@@ -492,7 +763,7 @@ def confirm_order(order_id):
             print(f"💰 Processing payment of ${payment_amount} for order #{order_id}")
             
             # Send data to transaction endpoint
-            transaction_response = requests.post(
+            transaction_response = transaction_client.post(
                 f"{TRANSACTION_SERVICE_URL}/transaction/purchase",
                 json=transaction_data
             )
@@ -516,13 +787,13 @@ def confirm_order(order_id):
                 # Update order status to payment_failed
                 try:
                     update_data = {"status": "payment_failed"}
-                    requests.patch(f"{ORDER_RECORDS_URL}/{order_id}", json=update_data)
+                    order_records_client.patch(f"{ORDER_RECORDS_URL}/{order_id}", json=update_data)
                     print(f"✅ Updated order #{order_id} status to 'payment_failed'")
                 except Exception as e:
                     print(f"❌ Failed to update order status: {str(e)[:100]}")
                 
-                # Publish unsuccessful transaction event with complete data
-                publish_to_rabbitmq("unsuccessful", base_message_data, order_id, user_id, product_id)
+                # Queue unsuccessful transaction event for background publishing
+                order_events.submit("unsuccessful", base_message_data, order_id, user_id, product_id)
                 
                 return jsonify({"error": f"Failed to process transaction: {error_msg}"}), 500
                     
@@ -536,13 +807,13 @@ def confirm_order(order_id):
             # Update order status to paid
             try:
                 update_data = {"status": "paid"}
-                requests.patch(f"{ORDER_RECORDS_URL}/{order_id}", json=update_data)
+                order_records_client.patch(f"{ORDER_RECORDS_URL}/{order_id}", json=update_data)
                 print(f"✅ Updated order #{order_id} status to 'paid'")
             except Exception as e:
                 print(f"❌ Failed to update order status: {str(e)[:100]}")
             
-            # Publish successful transaction event with complete data
-            publish_to_rabbitmq("successful", base_message_data, order_id, user_id, product_id)
+            # Queue successful transaction event for background publishing
+            order_events.submit("successful", base_message_data, order_id, user_id, product_id)
             
             # Return success response with transaction details
             return jsonify({
@@ -567,8 +838,8 @@ def confirm_order(order_id):
                 "status": "error"
             }
             
-            # Publish unsuccessful transaction event with complete data
-            publish_to_rabbitmq("unsuccessful", error_message_data, order_id, user_id, product_id)
+            # Queue unsuccessful transaction event for background publishing
+            order_events.submit("unsuccessful", error_message_data, order_id, user_id, product_id)
             
             return jsonify({"error": f"Error processing transaction: {error_msg}"}), 500
             
@@ -595,7 +866,7 @@ def notify_shipping_details(order_id):
         # Step 1: Get shipping information
         shipping_url = f"{SHIPPING_SERVICE_URL}/shipping/{order_id}"
         logger.info(f"Calling shipping service at: {shipping_url}")
-        shipping_response = requests.get(shipping_url)
+        shipping_response = shipping_client.get(shipping_url)
         logger.info(f"Shipping response status: {shipping_response.status_code}")
         
         if shipping_response.status_code != 200:
@@ -621,47 +892,30 @@ def notify_shipping_details(order_id):
             return jsonify({"error": "Incomplete shipping data"}), 400
             
         # Step 2: Get product details
-        product_url = f"{PRODUCT_DETAILS_URL}{product_id}"
-        logger.info(f"Calling product service at: {product_url}")
-        product_response = requests.get(product_url)
-        logger.info(f"Product response status: {product_response.status_code}")
-        
-        if product_response.status_code != 200:
-            logger.error(f"Failed to get product details: {product_response.status_code}")
+        product_data = get_product_details(product_id)
+        if product_data is None:
+            logger.error(f"Failed to get product details for product #{product_id}")
             return jsonify({"error": "Failed to retrieve product details"}), 500
             
-        product_data = product_response.json()
         product_name = product_data.get("productName", "")
         product_desc = product_data.get("productDesc", "")
         
         # Step 3: Get user details
-        user_url = f"{USER_INFO_URL}?id={user_id}"
-        logger.info(f"Calling user service at: {user_url}")
-        user_response = requests.get(user_url)
-        logger.info(f"User response status: {user_response.status_code}")
-        
-        if user_response.status_code != 200:
-            logger.error(f"Failed to get user details: {user_response.status_code}")
+        user_details = get_user_details(user_id, "user")
+        if user_details is None:
+            logger.error(f"Failed to get user details for user #{user_id}")
             return jsonify({"error": "Failed to retrieve user details"}), 500
             
-        user_data = user_response.json()
-        user_details = user_data.get("details", {})
         user_name = user_details.get("name", "")
         user_email = user_details.get("email", "")
         user_address = f"{user_details.get('street1', '')}, {user_details.get('city', '')}, {user_details.get('state', '')} {user_details.get('zip', '')}"
         
         # Step 4: Get renter details
-        renter_url = f"{USER_INFO_URL}?id={renter_id}"
-        logger.info(f"Calling user service for renter at: {renter_url}")
-        renter_response = requests.get(renter_url)
-        logger.info(f"Renter response status: {renter_response.status_code}")
-        
-        if renter_response.status_code != 200:
-            logger.error(f"Failed to get renter details: {renter_response.status_code}")
+        renter_details = get_user_details(renter_id, "renter")
+        if renter_details is None:
+            logger.error(f"Failed to get renter details for user #{renter_id}")
             return jsonify({"error": "Failed to retrieve renter details"}), 500
             
-        renter_data = renter_response.json()
-        renter_details = renter_data.get("details", {})
         renter_name = renter_details.get("name", "")
         renter_email = renter_details.get("email", "")
         renter_address = f"{renter_details.get('street1', '')}, {renter_details.get('city', '')}, {renter_details.get('state', '')} {renter_details.get('zip', '')}"
@@ -672,7 +926,7 @@ def notify_shipping_details(order_id):
             order_url = f"{ORDER_RECORDS_URL}/{order_id}"
             logger.info(f"Updating order #{order_id} status to 'shipping' at: {order_url}")
             
-            update_response = requests.patch(order_url, json=update_data)
+            update_response = order_records_client.patch(order_url, json=update_data)
             logger.info(f"Order update response status: {update_response.status_code}")
             
             if update_response.status_code == 404:
@@ -714,12 +968,12 @@ def notify_shipping_details(order_id):
         base_url = NOTIFICATION_URL.split('/notification/')[0]
         notification_url = f"{base_url}/notification/dual-email"
         logger.info(f"Using notification URL: {notification_url}")
-        notification_response = requests.post(notification_url, json=notification_data)
+        notification_response = notification_client.post(notification_url, json=notification_data)
                 
         logger.info(f"Calling notification service at: {notification_url}")
         logger.info(f"Notification payload: {json.dumps(notification_data, indent=2)}")
         
-        notification_response = requests.post(notification_url, json=notification_data)
+        notification_response = notification_client.post(notification_url, json=notification_data)
         logger.info(f"Notification response status: {notification_response.status_code}")
         logger.info(f"Notification response body: {notification_response.text[:100]}")
 
@@ -745,6 +999,16 @@ def notify_shipping_details(order_id):
         return jsonify({"error": "Error processing shipping notification"}), 500
 
 
+@app.route('/order_com/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the downstream lookup caches."""
+    return jsonify({
+        "userInfo": user_info_cache.stats(),
+        "product": product_cache.stats(),
+        "lookupThreads": LOOKUP_POOL_SIZE
+    }), 200
+
+
 if __name__ == '__main__':
     print("===== Order Communication Service Started =====")
     print("🔗 Endpoints configured:")
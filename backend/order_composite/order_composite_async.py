@@ -0,0 +1,353 @@
+"""
+Async mode of the order composite service.
+
+Serves create_order, confirm_order and notify_shipping_details on an ASGI
+server (Quart on hypercorn) using an async HTTP client (httpx), so a single
+worker can hold hundreds of in-flight orders while they wait on downstream
+services. Endpoints, payloads and responses match order_composite.py.
+
+Product and user lookups go through the same user info and product caches as
+the sync service, and transaction.* events through the same OrderEventPipeline
+(batched confirms, on-disk spill), all imported from order_composite.py.
+
+Run with:
+    hypercorn order_composite_async:app --bind 0.0.0.0:5001
+or set ASYNC_MODE=1 in the container. compare_load.py compares the two modes.
+"""
+import os
+import uuid
+import asyncio
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from quart import Quart, request, jsonify
+from quart_cors import cors
+from dotenv import load_dotenv
+
+# Load environment variables from local.env if present.
+load_dotenv("local.env")
+
+# Shared with the sync service: lookup caches and the order event pipeline
+import order_composite
+from order_composite import order_events, product_cache, user_info_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__)
+app = cors(
+    app,
+    allow_origin="*",
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
+    allow_headers=["Content-Type", "Authorization", "Accept", "Origin"]
+)
+
+# Service endpoints loaded from environment variables with defaults.
+ORDER_RECORDS_URL = os.environ.get("ORDER_RECORDS_URL", "http://localhost:5000/orders")
+ORDER_RECORDS_URL_GRAPHQL = os.environ.get("ORDER_RECORDS_URL_GRAPHQL", "http://localhost:5000/graphql")
+NOTIFICATION_URL = os.environ.get("NOTIFICATION_URL", "http://localhost:5010/notification/renter/notify")
+TRANSACTION_SERVICE_URL = os.environ.get("TRANSACTION_SERVICE_URL", "http://localhost:5003")
+SHIPPING_SERVICE_URL = os.environ.get("SHIPPING_SERVICE_URL", "http://localhost:5009")
+
+# Upper bound on concurrent connections per downstream
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 100))
+
+# Cache misses make blocking requests, so lookups run on their own thread pool, sized
+# for hundreds of in-flight orders (the loop's default executor stops at min(32, cpus + 4))
+ASYNC_LOOKUP_THREADS = int(os.environ.get("ASYNC_LOOKUP_THREADS", 256))
+lookup_executor = ThreadPoolExecutor(max_workers=ASYNC_LOOKUP_THREADS, thread_name_prefix="async-lookup")
+
+# Per-service timeouts, matching the sync service clients
+TIMEOUTS = {
+    "order-records": httpx.Timeout(10.0, connect=3.05),
+    "notification": httpx.Timeout(15.0, connect=3.05),
+    "transaction": httpx.Timeout(30.0, connect=3.05),  # Stripe charges can be slow
+    "shipping": httpx.Timeout(15.0, connect=3.05),
+}
+
+# Created on startup, once the event loop is running
+clients = {}
+
+
+@app.before_serving
+async def startup():
+    limits = httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE)
+    for name, timeout in TIMEOUTS.items():
+        clients[name] = httpx.AsyncClient(timeout=timeout, limits=limits)
+
+
+@app.after_serving
+async def shutdown():
+    for client in clients.values():
+        await client.aclose()
+
+
+async def get_product_details(product_id):
+    """Fetch product details through the shared product cache. Returns None on failure."""
+    return await asyncio.get_running_loop().run_in_executor(
+        lookup_executor, order_composite.get_product_details, product_id)
+
+
+async def get_user_details(user_id, role):
+    """Fetch the "details" block for a user through the shared user info cache. Returns None on failure."""
+    return await asyncio.get_running_loop().run_in_executor(
+        lookup_executor, order_composite.get_user_details, user_id, role)
+
+
+async def update_order_status(order_id, status):
+    """PATCH the order status in Order Records. Returns the response, or None on connection errors."""
+    try:
+        return await clients["order-records"].patch(f"{ORDER_RECORDS_URL}/{order_id}", json={"status": status})
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to update order #{order_id} to '{status}': {str(e)[:100]}")
+        return None
+
+
+@app.route('/order_com/orders', methods=['POST'])
+async def create_order():
+    data = await request.get_json()
+
+    # Basic validation: PRICE IS FROM UI AFTER CALCULATION OF DAYS*PER DAY CHARGE
+    required_fields = ['price', 'productId', 'renterID', 'startDate', 'endDate', 'userID']
+    if not all(k in data for k in required_fields):
+        missing_fields = [field for field in required_fields if field not in data]
+        return jsonify({"error": "Missing required fields", "missing": missing_fields}), 400
+
+    order_id = str(uuid.uuid4())
+    order_response = {
+        "orderID": order_id,
+        "paymentAmount": data["price"],
+        "productID": data["productId"],
+        "renterID": data["renterID"],
+        "startDate": data["startDate"],
+        "endDate": data["endDate"],
+        "status": "pending",
+        "userID": data["userID"],
+    }
+
+    async def post_order_record():
+        try:
+            records_response = await clients["order-records"].post(ORDER_RECORDS_URL, json=order_response)
+            if records_response.status_code != 201:
+                logger.error(f"Order Records failed: Status {records_response.status_code} - {records_response.text[:100]}")
+        except httpx.HTTPError as e:
+            logger.error(f"Order Records connection error: {str(e)[:100]}")
+
+    # The order record, product lookup and user lookup are independent
+    _, product_data, user_details = await asyncio.gather(
+        post_order_record(),
+        get_product_details(data['productId']),
+        get_user_details(data['renterID'], "user")
+    )
+    product_data = product_data or {}
+
+    notification_data = {
+        "renterEmail": (user_details or {}).get("email", ""),
+        "productID": data.get("productId"),
+        "prodDesc": product_data.get("productDesc", ""),
+        "originalImage": product_data.get("originalImageUrl", ""),
+        "orderID": order_id
+    }
+    try:
+        notification_response = await clients["notification"].post(NOTIFICATION_URL, json=notification_data)
+        if notification_response.status_code not in [200, 201]:
+            logger.error(f"Notification failed: Status {notification_response.status_code} - {notification_response.text[:100]}")
+    except httpx.HTTPError as e:
+        logger.error(f"Notification service connection error: {str(e)[:100]}")
+
+    logger.info(f"Order #{order_id} created successfully")
+    return jsonify(order_response), 201
+
+
+@app.route('/order_com/confirm/<string:order_id>', methods=['POST'])
+async def confirm_order(order_id):
+    """
+    Endpoint for renters to confirm pending orders.
+    """
+    try:
+        # Update order status to accepted
+        update_response = await update_order_status(order_id, "accepted")
+        if update_response is None:
+            return jsonify({"error": "Order Records connection error"}), 500
+        if update_response.status_code == 404:
+            return jsonify({"error": "Order not found"}), 404
+        if update_response.status_code != 200:
+            error_msg = f"Status {update_response.status_code} - {update_response.text[:100]}"
+            return jsonify({"error": error_msg}), 500
+
+        # Retrieve the updated order details
+        query = """
+        query GetOrder($orderID: String!) {
+            order(orderID: $orderID) {
+                orderID
+                paymentAmount
+                dailyPayment
+                productID
+                renterID
+                startDate
+                endDate
+                status
+                userID
+            }
+        }
+        """
+        try:
+            order_response = await clients["order-records"].post(
+                ORDER_RECORDS_URL_GRAPHQL, json={"query": query, "variables": {"orderID": order_id}}
+            )
+        except httpx.HTTPError as e:
+            return jsonify({"error": f"Error connecting to Order Records service: {str(e)[:100]}"}), 500
+        if order_response.status_code != 200:
+            return jsonify({"error": f"Status {order_response.status_code} - {order_response.text[:100]}"}), 500
+        response_data = order_response.json()
+        if "errors" in response_data:
+            return jsonify({"error": f"GraphQL errors: {str(response_data['errors'])[:100]}"}), 500
+
+        order_data = response_data['data']['order']
+        user_id = order_data.get("userID")
+        product_id = order_data.get("productID")
+        payment_amount = order_data.get("paymentAmount")
+
+        # Process the transaction with the userID
+        base_message_data = {
+            "orderID": order_id,
+            "userID": user_id,
+            "paymentAmount": payment_amount,
+            "status": "accepted"
+        }
+        try:
+            transaction_response = await clients["transaction"].post(
+                f"{TRANSACTION_SERVICE_URL}/transaction/purchase",
+                json={"orderID": order_id, "userID": user_id, "paymentAmt": payment_amount}
+            )
+        except httpx.HTTPError as e:
+            error_msg = str(e)[:100]
+            order_events.submit("unsuccessful", dict(base_message_data, error=error_msg, status="error"),
+                                order_id, user_id, product_id)
+            return jsonify({"error": f"Error processing transaction: {error_msg}"}), 500
+
+        if transaction_response.status_code not in [200, 201]:
+            error_msg = f"Status {transaction_response.status_code} - {transaction_response.text[:100]}"
+            base_message_data["error"] = error_msg
+            base_message_data["status"] = "payment_failed"
+            await update_order_status(order_id, "payment_failed")
+            order_events.submit("unsuccessful", base_message_data, order_id, user_id, product_id)
+            return jsonify({"error": f"Failed to process transaction: {error_msg}"}), 500
+
+        # Transaction was successful
+        transaction_result = transaction_response.json()
+        base_message_data["transactionID"] = transaction_result.get("transactionID")
+        await update_order_status(order_id, "paid")
+        order_events.submit("successful", base_message_data, order_id, user_id, product_id)
+
+        return jsonify({
+            "message": "Order confirmed and payment processed successfully",
+            "orderID": order_id,
+            "userID": user_id,
+            "paymentAmount": payment_amount,
+            "status": "accepted",
+            "transactionResult": transaction_result
+        }), 200
+
+    except Exception as e:
+        error_msg = str(e)[:100]
+        logger.error(f"General confirm order error: {error_msg}")
+        return jsonify({"error": f"Error confirming order: {error_msg}"}), 500
+
+
+def format_address(details):
+    return f"{details.get('street1', '')}, {details.get('city', '')}, {details.get('state', '')} {details.get('zip', '')}"
+
+
+@app.route('/order_com/notify-shipping/<string:order_id>', methods=['POST'])
+async def notify_shipping_details(order_id):
+    """Send shipping notifications to both user and renter"""
+    try:
+        # Step 1: Get shipping information
+        shipping_response = await clients["shipping"].get(f"{SHIPPING_SERVICE_URL}/shipping/{order_id}")
+        if shipping_response.status_code != 200:
+            logger.error(f"Failed to get shipping data: {shipping_response.status_code}")
+            return jsonify({"error": "Failed to retrieve shipping data"}), 500
+
+        shipping_data = shipping_response.json()
+        tracking_number = shipping_data.get("tracking_number")
+        carrier = shipping_data.get("carrier", "USPS")
+        user_id = shipping_data.get("user_id")
+        renter_id = shipping_data.get("renter_id")
+        product_id = shipping_data.get("product_id")
+        if not all([tracking_number, user_id, renter_id, product_id]):
+            logger.error(f"Shipping data incomplete")
+            return jsonify({"error": "Incomplete shipping data"}), 400
+
+        # Steps 2-4: product, user and renter lookups are independent
+        product_data, user_details, renter_details = await asyncio.gather(
+            get_product_details(product_id),
+            get_user_details(user_id, "user"),
+            get_user_details(renter_id, "renter")
+        )
+        if product_data is None:
+            return jsonify({"error": "Failed to retrieve product details"}), 500
+        if user_details is None:
+            return jsonify({"error": "Failed to retrieve user details"}), 500
+        if renter_details is None:
+            return jsonify({"error": "Failed to retrieve renter details"}), 500
+
+        # Step 5: Update order status to "shipping" in Order Records
+        update_response = await update_order_status(order_id, "shipping")
+        if update_response is not None and update_response.status_code == 404:
+            return jsonify({"error": "Order not found"}), 404
+        # Continue with notification even if the status update failed otherwise
+
+        # Step 6: Send dual notification
+        notification_data = {
+            "orderID": order_id,
+            "productID": product_id,
+            "productName": product_data.get("productName", ""),
+            "productDesc": product_data.get("productDesc", ""),
+            "userID": user_id,
+            "userEmail": user_details.get("email", ""),
+            "userName": user_details.get("name", ""),
+            "userAddress": format_address(user_details),
+            "renterID": renter_id,
+            "renterEmail": renter_details.get("email", ""),
+            "renterName": renter_details.get("name", ""),
+            "renterAddress": format_address(renter_details),
+            "trackingNumber": tracking_number,
+            "shippingCarrier": carrier,
+            "notificationType": "order_shipped"
+        }
+        base_url = NOTIFICATION_URL.split('/notification/')[0]
+        notification_response = await clients["notification"].post(
+            f"{base_url}/notification/dual-email", json=notification_data
+        )
+        if notification_response.status_code not in [200, 201, 206]:
+            logger.error(f"Failed to send notifications: {notification_response.status_code}")
+            return jsonify({"error": "Failed to send notifications"}), 500
+
+        return jsonify({
+            "message": "Shipping notifications sent successfully",
+            "orderID": order_id,
+            "trackingNumber": tracking_number,
+            "carrier": carrier
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error in shipping notification: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({"error": "Error processing shipping notification"}), 500
+
+
+@app.route('/order_com/cache/stats', methods=['GET'])
+async def cache_stats():
+    """Hit/miss counters for the downstream lookup caches."""
+    return jsonify({
+        "userInfo": user_info_cache.stats(),
+        "product": product_cache.stats(),
+        "lookupThreads": ASYNC_LOOKUP_THREADS
+    }), 200
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5001)
@@ -0,0 +1,133 @@
+"""
+Client-side cache of inventory product details.
+
+The inventory service publishes an `inventory.changed` event on the order
+exchange whenever a product is added, updated or removed. ProductCache keeps
+product details in memory and subscribes to those events, dropping an entry as
+soon as the product changes. Entries are only served while the subscription is
+live; if the connection to RabbitMQ drops the cache is cleared and reads go
+straight to the inventory service until it reconnects.
+
+Identical copies of this module ship with every service that reads products
+(order_composite, late_charge_microservice, report_damage_composite_microservice).
+"""
+import collections
+import json
+import logging
+import threading
+import time
+
+import pika
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_CHANGED_ROUTING_KEY = "inventory.changed"
+
+
+class ProductCache:
+    def __init__(self, fetch_product, rabbitmq_host, exchange="order_exchange",
+                 ttl=300, max_size=5000, reconnect_delay=5):
+        """
+        Args:
+            fetch_product: Callable taking a productID and returning the product
+                dict, or None if the product does not exist. May raise on errors.
+            rabbitmq_host: RabbitMQ host to subscribe for inventory.changed events
+            exchange: Topic exchange the inventory service publishes on
+            ttl: Upper bound in seconds on how long an entry is served
+            max_size: Maximum number of cached products (least recently used evicted)
+        """
+        self.fetch_product = fetch_product
+        self.rabbitmq_host = rabbitmq_host
+        self.exchange = exchange
+        self.ttl = ttl
+        self.max_size = max_size
+        self.reconnect_delay = reconnect_delay
+
+        self._entries = collections.OrderedDict()  # productID -> (product, expires_at)
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped on every invalidation
+        self._subscribed = False
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def start(self):
+        """Start the background inventory.changed subscriber."""
+        subscriber_thread = threading.Thread(target=self._subscribe_loop, name="product-cache-subscriber")
+        subscriber_thread.daemon = True
+        subscriber_thread.start()
+
+    def get(self, product_id):
+        """Return product details for product_id, or None if not found. Fetch errors propagate."""
+        key = str(product_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return dict(entry[0])
+            self._stats["misses"] += 1
+            generation = self._generation
+
+        product = self.fetch_product(product_id)
+
+        with self._lock:
+            # Skip storing if a change event arrived while we were fetching,
+            # since the response may predate the change.
+            if product is not None and self._subscribed and generation == self._generation:
+                self._entries[key] = (product, time.monotonic() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+        return dict(product) if product is not None else None
+
+    def invalidate(self, product_id=None):
+        """Drop one product, or every product if product_id is None."""
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+            if product_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(product_id), None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), maxSize=self.max_size,
+                        ttlSeconds=self.ttl, subscribed=self._subscribed)
+
+    def _on_inventory_changed(self, ch, method, properties, body):
+        try:
+            product_id = json.loads(body).get("productID")
+        except ValueError:
+            product_id = None
+        logger.debug(f"inventory.changed received for product {product_id}")
+        self.invalidate(product_id)
+
+    def _subscribe_loop(self):
+        while True:
+            try:
+                connection = pika.BlockingConnection(
+                    pika.ConnectionParameters(host=self.rabbitmq_host, heartbeat=60)
+                )
+                channel = connection.channel()
+                channel.exchange_declare(exchange=self.exchange, exchange_type='topic', durable=True)
+                # Every process needs every event, so each gets its own exclusive queue
+                result = channel.queue_declare(queue='', exclusive=True, auto_delete=True)
+                queue_name = result.method.queue
+                channel.queue_bind(exchange=self.exchange, queue=queue_name,
+                                   routing_key=INVENTORY_CHANGED_ROUTING_KEY)
+                channel.basic_consume(queue=queue_name, on_message_callback=self._on_inventory_changed,
+                                      auto_ack=True)
+
+                # Anything cached before the subscription was live may be stale
+                with self._lock:
+                    self._subscribed = True
+                self.invalidate()
+                logger.info("Product cache subscribed to inventory.changed events")
+                channel.start_consuming()
+            except Exception as e:
+                logger.warning(f"Product cache subscriber disconnected: {e!r}")
+            with self._lock:
+                self._subscribed = False
+            self.invalidate()
+            time.sleep(self.reconnect_delay)
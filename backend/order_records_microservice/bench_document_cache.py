@@ -0,0 +1,108 @@
+"""
+Time full POST /graphql requests with and without the document cache.
+
+Both cases go through OrderGraphQLView in the Flask test client: request
+parsing, persisted query lookup, document preparation, execution with the
+resolver timing middleware, and JSON serialization. "default" is a view
+with graphql-core's default backend, which parses and validates the query
+on every request; "cached" is the app's own /graphql view with
+CachedDocumentBackend. Firestore is replaced by an in-memory fake holding
+--orders orders, so no credentials or network are needed. Run it from this
+directory:
+    python bench_document_cache.py --number 2000
+"""
+import argparse
+import os
+import timeit
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", "credentials.json")
+
+from graphql.backend.core import GraphQLCoreBackend
+
+# The module warms up a Firestore client pool at import time
+with mock.patch("google.cloud.firestore.Client"):
+    import orderRecords
+
+QUERIES = {
+    # check_expiry's nightly query
+    "overdueOrders": ("""
+    query {
+      overdueOrders { orderID dailyPayment productID renterID endDate status userID }
+    }
+    """, None),
+    # the order composite's confirm path
+    "GetOrder": ("""
+    query GetOrder($orderID: String!) {
+        order(orderID: $orderID) {
+            orderID paymentAmount dailyPayment productID renterID startDate endDate status userID
+        }
+    }
+    """, {"orderID": "1"}),
+}
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.id = data["orderID"]
+        self.exists = True
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeOrders:
+    """Stands in for the orders collection and every query built on it."""
+
+    def __init__(self, count):
+        end = datetime.now(timezone.utc) - timedelta(days=1)
+        self.snapshots = [FakeSnapshot({
+            "orderID": str(i), "userID": 1, "renterID": 2, "productID": i, "status": "late",
+            "paymentAmount": 30.0, "dailyPayment": 10.0,
+            "startDate": end - timedelta(days=3), "endDate": end,
+        }) for i in range(1, count + 1)]
+
+    def where(self, *args, **kwargs):
+        return self
+
+    order_by = start_after = limit = where
+
+    def stream(self):
+        return iter(self.snapshots)
+
+    def document(self, doc_id):
+        return mock.Mock(get=lambda: self.snapshots[0])
+
+
+def post(client, path, query, variables):
+    response = client.post(path, json={"query": query, "variables": variables})
+    assert response.status_code == 200 and "errors" not in response.get_json(), response.get_data(as_text=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000, help="requests per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="measurements per case (best is reported)")
+    parser.add_argument("--orders", type=int, default=5, help="orders the fake overdueOrders query returns")
+    args = parser.parse_args()
+
+    fake_db = mock.Mock(collection=mock.Mock(return_value=FakeOrders(args.orders)))
+    orderRecords.get_firestore_client = lambda: fake_db
+    orderRecords.app.add_url_rule(
+        '/graphql-default',
+        view_func=orderRecords.OrderGraphQLView.as_view(
+            'graphql_default', schema=orderRecords.schema, backend=GraphQLCoreBackend(),
+            middleware=[orderRecords.ResolverTimingMiddleware()])
+    )
+    client = orderRecords.app.test_client()
+
+    for name, (query, variables) in QUERIES.items():
+        post(client, "/graphql", query, variables)  # first request parses and caches it
+        before = min(timeit.repeat(lambda: post(client, "/graphql-default", query, variables),
+                                   number=args.number, repeat=args.repeat))
+        after = min(timeit.repeat(lambda: post(client, "/graphql", query, variables),
+                                  number=args.number, repeat=args.repeat))
+        print(f"📊 {name:<14} default {before / args.number * 1e6:8.1f} µs/request  "
+              f"cached {after / args.number * 1e6:8.1f} µs/request  ({before / after:.2f}x)")
@@ -0,0 +1,71 @@
+"""
+One-shot migration: re-key order records by orderID.
+
+Orders used to be stored under random document IDs from collection.add(),
+so every read and status update had to query by orderID. orderRecords.py now
+addresses orders directly as document(orderID). This script copies every
+order whose document ID does not match its orderID to the deterministic ID
+and deletes the old document, in batched writes.
+
+Run it once, with the order records service stopped, from this directory:
+    python migrate_order_doc_ids.py --dry-run
+    python migrate_order_doc_ids.py
+"""
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from google.cloud import firestore
+
+BATCH_SIZE = 250  # two writes per order; Firestore batches hold at most 500
+
+
+def migrate(db, collection_name, dry_run=False):
+    collection = db.collection(collection_name)
+    docs = list(collection.stream())
+    existing_ids = {doc.id for doc in docs}
+
+    moves = []
+    claimed = set()
+    for doc in docs:
+        data = doc.to_dict()
+        order_id = data.get("orderID")
+        if not order_id or "/" in str(order_id):
+            print(f"⚠️ Skipping {doc.id}: missing or invalid orderID {order_id!r}")
+            continue
+        target_id = str(order_id)
+        if doc.id == target_id:
+            continue
+        if target_id in existing_ids or target_id in claimed:
+            print(f"❌ Conflict: {doc.id} has orderID {order_id} but document {target_id} already exists; skipping")
+            continue
+        claimed.add(target_id)
+        moves.append((doc, target_id, data))
+
+    print(f"🔍 {len(docs)} orders, {len(moves)} to migrate")
+    if dry_run:
+        for doc, target_id, _ in moves:
+            print(f"  {doc.id} -> {target_id}")
+        return len(moves)
+
+    for start in range(0, len(moves), BATCH_SIZE):
+        batch = db.batch()
+        for doc, target_id, data in moves[start:start + BATCH_SIZE]:
+            batch.create(collection.document(target_id), data)
+            batch.delete(doc.reference)
+        batch.commit()
+        print(f"✅ Migrated {min(start + BATCH_SIZE, len(moves))}/{len(moves)}")
+    return len(moves)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="list the documents that would move without writing")
+    parser.add_argument("--collection", default=os.getenv("FIRESTORE_COLLECTION", "default_collection"),
+                        help="order records collection (defaults to FIRESTORE_COLLECTION)")
+    args = parser.parse_args()
+
+    migrate(firestore.Client(), args.collection, dry_run=args.dry_run)
+    sys.exit(0)
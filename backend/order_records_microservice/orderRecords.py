@@ -1,20 +1,475 @@
 import os
+import base64
+import bisect
+import collections
+import hashlib
+import itertools
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import graphene
-from flask import Flask, jsonify, request
+import pika
+import requests
+from requests.adapters import HTTPAdapter
+from flask import Flask, jsonify, request, Response, stream_with_context
 from flask_graphql import GraphQLView
+from graphql import GraphQLError, validate
+from graphql.language import ast
+from graphql.backend.base import GraphQLDocument
+from graphql.backend.core import GraphQLCoreBackend
+from graphql.execution import ExecutionResult, execute
+from graphql_server import HttpQueryError
+from promise import Promise
+from promise.dataloader import DataLoader
 from google.cloud import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
 from dotenv import load_dotenv
 from datetime import datetime, timezone
+from order_summaries import SUMMARY_COLLECTION, SummaryDeltas, summary_doc_id
 
 # Load environment variables
 load_dotenv()
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 COLLECTION_NAME = os.getenv("FIRESTORE_COLLECTION", "default_collection")
+# Statuses that count as overdue once endDate has passed
+OVERDUE_STATUSES = ["paid", "late"]
+MAX_QUERY_LIMIT = 500
+# Status changes accepted per batch request
+MAX_BATCH_UPDATE = 500
+# Firestore batched writes hold at most 500 operations (order updates plus summary writes)
+MAX_WRITES_PER_COMMIT = 500
+# Tries for a status batch rejected because an order in it changed concurrently
+STATUS_UPDATE_ATTEMPTS = 3
+# Page sizes for the *Connection fields
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Nested product/user fields are loaded from the owning services
+INVENTORY_BATCH_GET_URL = os.getenv("INVENTORY_BATCH_GET_URL", "http://inventory:5020/inventory/products:batchGet")
+USER_INFO_URL = os.getenv("USER_INFO_URL", "https://personal-s5llcxwn.outsystemscloud.com/userMS/rest/user/getUserInfo")
+MAX_PRODUCT_BATCH = 300  # inventory's batchGet limit
+# Firestore clients (one gRPC channel each) shared by the worker threads of a process
+FIRESTORE_CHANNEL_POOL_SIZE = int(os.getenv("FIRESTORE_CHANNEL_POOL_SIZE", 2))
+# Change-data-capture events for order writes
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq")
+EXCHANGE_NAME = os.getenv("EXCHANGE_NAME", "order_exchange")
+STATUS_CHANGED_ROUTING_KEY = "order.status_changed"
+# Each open event stream holds a worker thread, so streams per process are capped
+MAX_EVENT_SUBSCRIBERS = int(os.getenv("MAX_EVENT_SUBSCRIBERS", 16))
+EVENT_STREAM_HEARTBEAT = 15  # seconds between keep-alive comments on idle streams
+# Parsed and validated GraphQL documents kept per process, and persisted query hashes remembered
+DOCUMENT_CACHE_SIZE = int(os.getenv("GRAPHQL_DOCUMENT_CACHE_SIZE", 256))
+PERSISTED_QUERY_CACHE_SIZE = int(os.getenv("PERSISTED_QUERY_CACHE_SIZE", 1000))
+# Queries deeper or more expensive than this are rejected before any resolver runs
+MAX_QUERY_DEPTH = int(os.getenv("GRAPHQL_MAX_DEPTH", 8))
+MAX_QUERY_COMPLEXITY = int(os.getenv("GRAPHQL_MAX_COMPLEXITY", 10000))
 
 app = Flask(__name__)
 
+class FirestoreClientPool:
+    """
+    Process-wide Firestore clients, created once and shared by every request.
+
+    Each client owns one gRPC channel. Calls are spread round-robin across the
+    pool so concurrent worker threads do not all queue on a single channel.
+    Clients are created lazily inside each gunicorn worker (gRPC channels must
+    not cross a fork), and warm_up() opens the channels and loads credentials
+    before the first request arrives. health() probes every channel with a
+    real read and retries a warm-up that failed at start-up.
+    """
+
+    def __init__(self, size, probe_interval=5, probe_timeout=2):
+        self.size = max(1, size)
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self._clients = []
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._counter = itertools.count()
+        self._probed_at = None
+        self.warm_up_ms = None
+        self.warm_up_error = None
+        self.probe_ms = None
+        self.probe_error = None
+
+    def _ensure_clients(self):
+        if not self._clients:
+            with self._lock:
+                if not self._clients:
+                    self._clients = [firestore.Client() for _ in range(self.size)]
+        return self._clients
+
+    def _read_each(self, timeout):
+        """One-document read on every client: opens idle channels and fails if any cannot reach Firestore."""
+        start = time.monotonic()
+        for client in self._ensure_clients():
+            client.collection(COLLECTION_NAME).limit(1).get(timeout=timeout)
+        return round((time.monotonic() - start) * 1000, 1)
+
+    def get(self):
+        clients = self._ensure_clients()
+        return clients[next(self._counter) % len(clients)]
+
+    def warm_up(self, timeout=10):
+        """Open every channel with a one-document read so the first real query is not a cold start."""
+        try:
+            self.warm_up_ms = self._read_each(timeout)
+            self.warm_up_error = None
+            print(f"✅ Firestore pool warmed up ({self.size} channel(s)) in {self.warm_up_ms} ms")
+        except Exception as e:
+            self.warm_up_error = str(e)
+            print(f"❌ Firestore warm-up failed: {e}")
+
+    def health(self):
+        # Probe at most once per probe_interval, however often the health check is polled
+        with self._probe_lock:
+            if self._probed_at is None or time.monotonic() - self._probed_at >= self.probe_interval:
+                if self.warm_up_ms is None:
+                    # Warm-up never succeeded (e.g. Firestore was unreachable at start-up): retry it
+                    self.warm_up(timeout=self.probe_timeout)
+                    self.probe_ms, self.probe_error = self.warm_up_ms, self.warm_up_error
+                else:
+                    try:
+                        self.probe_ms, self.probe_error = self._read_each(self.probe_timeout), None
+                    except Exception as e:
+                        self.probe_ms, self.probe_error = None, str(e)
+                self._probed_at = time.monotonic()
+        return {
+            "status": "ok" if self.probe_error is None else "unavailable",
+            "poolSize": self.size,
+            "probeMs": self.probe_ms,
+            "probeError": self.probe_error,
+            "warmUpMs": self.warm_up_ms,
+            "warmUpError": self.warm_up_error,
+        }
+
+firestore_pool = FirestoreClientPool(FIRESTORE_CHANNEL_POOL_SIZE)
+firestore_pool.warm_up()
+
 def get_firestore_client():
-    return firestore.Client()
+    return firestore_pool.get()
+
+class OrderEventPublisher:
+    """
+    Publishes order.status_changed events on the order exchange after every
+    order write, so consumers can react to changes instead of polling.
+
+    publish() only enqueues, so a slow or unreachable broker never holds up a
+    write; a background thread owns the connection and drains the queue. If
+    the broker stays down long enough for the queue to fill, new events are
+    dropped (and logged) rather than blocking writers.
+    """
+
+    def __init__(self, host, exchange, max_pending=10000, reconnect_delay=5):
+        self.host = host
+        self.exchange = exchange
+        self.reconnect_delay = reconnect_delay
+        self.events = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.started = False
+
+    def publish(self, events):
+        """Queue status change events for publishing; never blocks or raises to the writer."""
+        with self.lock:
+            if not self.started:
+                publisher_thread = threading.Thread(target=self._publish_loop, name="order-event-publisher")
+                publisher_thread.daemon = True
+                publisher_thread.start()
+                self.started = True
+        for event in events:
+            try:
+                self.events.put_nowait(event)
+            except queue.Full:
+                print(f"⚠️ Event queue full, dropping {STATUS_CHANGED_ROUTING_KEY} for order {event['orderID']}")
+
+    def _connect(self):
+        # Short timeouts: a broker that is down should cost seconds, not the OS TCP timeout
+        connection = pika.BlockingConnection(pika.ConnectionParameters(
+            host=self.host,
+            connection_attempts=1,
+            socket_timeout=2,
+            blocked_connection_timeout=5,
+            heartbeat=60
+        ))
+        channel = connection.channel()
+        channel.exchange_declare(exchange=self.exchange, exchange_type='topic', durable=True)
+        return connection, channel
+
+    def _publish_loop(self):
+        connection = channel = None
+        event = None
+        while True:
+            try:
+                if event is None:
+                    try:
+                        event = self.events.get(timeout=30)
+                    except queue.Empty:
+                        # Idle: service heartbeats so the broker keeps the connection
+                        if connection is not None and connection.is_open:
+                            connection.process_data_events(time_limit=0)
+                        continue
+                if channel is None or channel.is_closed or connection.is_closed:
+                    connection, channel = self._connect()
+                channel.basic_publish(
+                    exchange=self.exchange,
+                    routing_key=STATUS_CHANGED_ROUTING_KEY,
+                    body=json.dumps(event),
+                    properties=pika.BasicProperties(content_type='application/json', delivery_mode=2)
+                )
+                event = None
+            except Exception as e:
+                # Keep the event and retry it once the broker is reachable again
+                pending = f" for order {event['orderID']}" if event else ""
+                print(f"⚠️ Failed to publish {STATUS_CHANGED_ROUTING_KEY}{pending}: {e!r}")
+                connection = channel = None
+                time.sleep(self.reconnect_delay)
+
+class OrderEventStream:
+    """
+    Fans order.status_changed events out to Server-Sent Events subscribers.
+
+    Writes can land in any worker process, so each process binds its own
+    exclusive queue the first time a client subscribes and hands every event
+    to the subscribers watching the order's user or renter. A subscriber that
+    falls too far behind loses events rather than blocking the others.
+    """
+
+    def __init__(self, host, exchange, max_subscribers, reconnect_delay=5):
+        self.host = host
+        self.exchange = exchange
+        self.max_subscribers = max_subscribers
+        self.reconnect_delay = reconnect_delay
+        self.subscribers = collections.defaultdict(set)  # userID -> set of queue.Queue
+        self.count = 0
+        self.lock = threading.Lock()
+        self.started = False
+
+    def subscribe(self, user_id):
+        """Return a queue receiving the user's events, or None if this process is at capacity."""
+        with self.lock:
+            if self.count >= self.max_subscribers:
+                return None
+            if not self.started:
+                consumer_thread = threading.Thread(target=self._consume_loop, name="order-event-stream")
+                consumer_thread.daemon = True
+                consumer_thread.start()
+                self.started = True
+            events = queue.Queue(maxsize=100)
+            self.subscribers[user_id].add(events)
+            self.count += 1
+            return events
+
+    def unsubscribe(self, user_id, events):
+        with self.lock:
+            if events in self.subscribers.get(user_id, ()):
+                self.subscribers[user_id].discard(events)
+                self.count -= 1
+                if not self.subscribers[user_id]:
+                    del self.subscribers[user_id]
+
+    def _on_event(self, ch, method, properties, body):
+        try:
+            event = json.loads(body)
+        except ValueError:
+            return
+        with self.lock:
+            targets = [events for user_id in {event.get("userID"), event.get("renterID")}
+                       for events in self.subscribers.get(user_id, ())]
+        for events in targets:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def _consume_loop(self):
+        while True:
+            try:
+                connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host, heartbeat=60))
+                channel = connection.channel()
+                channel.exchange_declare(exchange=self.exchange, exchange_type='topic', durable=True)
+                result = channel.queue_declare(queue='', exclusive=True, auto_delete=True)
+                channel.queue_bind(exchange=self.exchange, queue=result.method.queue,
+                                   routing_key=STATUS_CHANGED_ROUTING_KEY)
+                channel.basic_consume(queue=result.method.queue, on_message_callback=self._on_event, auto_ack=True)
+                print(f"✅ Streaming {STATUS_CHANGED_ROUTING_KEY} events to SSE subscribers")
+                channel.start_consuming()
+            except Exception as e:
+                print(f"⚠️ Order event stream disconnected: {e!r}")
+            time.sleep(self.reconnect_delay)
+
+order_events = OrderEventPublisher(RABBITMQ_HOST, EXCHANGE_NAME)
+order_event_stream = OrderEventStream(RABBITMQ_HOST, EXCHANGE_NAME, MAX_EVENT_SUBSCRIBERS)
+
+def status_change_event(data, before, after, version):
+    """order.status_changed payload; before is None for a newly created order."""
+    return {
+        "orderID": data.get("orderID"),
+        "userID": data.get("userID"),
+        "renterID": data.get("renterID"),
+        "productID": data.get("productID"),
+        "before": before,
+        "after": after,
+        "version": version,
+        "changedAt": datetime.now(timezone.utc).isoformat(),
+    }
+
+def set_order_status(db, order_id, status):
+    """
+    Change one order's status and bump its version in a transaction, so the
+    event reports the true previous status. Raises NotFound for unknown orders.
+    Returns the published event, or None if the order already had that status
+    (nothing is written or published).
+    """
+    doc_ref = db.collection(COLLECTION_NAME).document(order_doc_id(order_id))
+
+    @firestore.transactional
+    def change(transaction):
+        snapshot = doc_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            raise NotFound(f"Order {order_id} not found")
+        data = snapshot.to_dict()
+        if data.get("status") == status:
+            return None
+        version = data.get("version", 0) + 1
+        transaction.update(doc_ref, {"status": status, "version": version})
+        summaries = SummaryDeltas()
+        summaries.add(data, data.get("status"), status)
+        summaries.write(db, transaction)
+        return status_change_event(data, data.get("status"), status, version)
+
+    event = change(db.transaction())
+    if event is not None:
+        order_events.publish([event])
+    return event
+
+def order_doc_id(order_id):
+    """Orders are stored under their orderID (see migrate_order_doc_ids.py)."""
+    return str(order_id)
+
+def apply_status_updates(db, updates):
+    """
+    Apply many status changes with one get_all and batched writes.
+    Orders already in the requested status are reported as ok but not written.
+    Each write is conditioned on the document being unchanged since the read,
+    so the published before/after statuses and versions are exact. Summary
+    changes are committed in the same batch as their orders; a request only
+    spans more than one batch when orders plus summaries exceed
+    MAX_WRITES_PER_COMMIT. A batch rejected because one of its orders changed
+    concurrently is re-read and retried, up to STATUS_UPDATE_ATTEMPTS times.
+
+    Args:
+        updates: list of (orderID, status), at most MAX_BATCH_UPDATE
+    Returns:
+        list of {"orderID", "ok", "status" or "error"}, in request order.
+        Unknown orders are reported and skipped; if a batch still fails, every
+        order that was part of it is reported as failed.
+    """
+    collection = db.collection(COLLECTION_NAME)
+    refs = {str(order_id): collection.document(order_doc_id(order_id)) for order_id, _ in updates}
+    # Repeated orderIDs: the last status in the request wins
+    final_status = {str(order_id): status for order_id, status in updates}
+
+    found = set()
+    write_errors = {}  # orderID -> error of the last batch it was in
+    pending = list(final_status)
+    for attempt in range(STATUS_UPDATE_ATTEMPTS):
+        existing = {snapshot.id: snapshot for snapshot in db.get_all([refs[order_id] for order_id in pending])
+                    if snapshot.exists}
+        found.update(existing)
+
+        chunks = []  # (batch, orderIDs, summaries, events)
+        for order_id in pending:
+            snapshot = existing.get(order_id)
+            if snapshot is None:
+                continue
+            status = final_status[order_id]
+            data = snapshot.to_dict()
+            if data.get("status") == status:
+                write_errors.pop(order_id, None)
+                continue  # already in that status: no write, no version bump, no event
+            # Each order adds one write plus at most two new summary documents
+            if not chunks or len(chunks[-1][1]) + len(chunks[-1][2]) + 3 > MAX_WRITES_PER_COMMIT:
+                chunks.append((db.batch(), [], SummaryDeltas(), []))
+            batch, order_ids, summaries, events = chunks[-1]
+            version = data.get("version", 0) + 1
+            batch.update(refs[order_id], {"status": status, "version": version},
+                         option=db.write_option(last_update_time=snapshot.update_time))
+            summaries.add(data, data.get("status"), status)
+            order_ids.append(order_id)
+            events.append(status_change_event(data, data.get("status"), status, version))
+
+        retry = []
+        for batch, order_ids, summaries, events in chunks:
+            summaries.write(db, batch)
+            try:
+                batch.commit()
+            except FailedPrecondition as e:
+                # An order in this batch was written since we read it: re-read the batch and retry
+                print(f"⚠️ Batched status update conflicted (attempt {attempt + 1}/{STATUS_UPDATE_ATTEMPTS}): {e}")
+                write_errors.update((order_id, str(e)) for order_id in order_ids)
+                retry.extend(order_ids)
+                continue
+            except Exception as e:
+                print(f"❌ Batched status update failed: {e}")
+                write_errors.update((order_id, str(e)) for order_id in order_ids)
+                continue
+            for order_id in order_ids:
+                write_errors.pop(order_id, None)
+            order_events.publish(events)
+        if not retry:
+            break
+        pending = retry
+
+    results = []
+    for order_id, status in updates:
+        order_id = str(order_id)
+        if order_id not in found:
+            results.append({"orderID": order_id, "ok": False, "error": "Order not found"})
+        elif order_id in write_errors:
+            results.append({"orderID": order_id, "ok": False, "error": write_errors[order_id]})
+        else:
+            results.append({"orderID": order_id, "ok": True, "status": final_status[order_id]})
+    return results
+
+def order_query(db, equals=None, statuses=None, range_filter=None, order_by=None, descending=False,
+                start_after=None, limit=None):
+    """
+    Build an order query in the shape the composite indexes in
+    firestore.indexes.json cover: equality filters, an optional status IN
+    filter, at most one range filter, then ordering and a limit.
+    Firestore requires a range-filtered field to be ordered first, so that
+    ordering is added ahead of order_by. Every combination a resolver uses
+    needs a matching index in firestore.indexes.json.
+
+    Args:
+        equals: {field: value} equality filters
+        statuses: list of statuses (status IN ...)
+        range_filter: (field, op, value), e.g. ("endDate", "<", now)
+        order_by: field to sort by
+        descending: sort order for order_by
+        start_after: document snapshot to resume after (cursor pagination)
+        limit: maximum number of orders (capped at MAX_QUERY_LIMIT)
+    """
+    query = db.collection(COLLECTION_NAME)
+    for field, value in (equals or {}).items():
+        query = query.where(field, "==", value)
+    if statuses:
+        query = query.where("status", "in", list(statuses))
+    if range_filter is not None:
+        field, op, value = range_filter
+        query = query.where(field, op, value)
+        if order_by != field:
+            query = query.order_by(field)
+    if order_by is not None:
+        direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+        query = query.order_by(order_by, direction=direction)
+    if start_after is not None:
+        query = query.start_after(start_after)
+    if limit is not None:
+        query = query.limit(min(limit, MAX_QUERY_LIMIT))
+    return query
 
 def convert_order_data(data: dict) -> dict:
     for key in ["startDate", "endDate"]:
@@ -22,6 +477,28 @@ def convert_order_data(data: dict) -> dict:
             data[key] = data[key].isoformat()
     return data
 
+class Product(graphene.ObjectType):
+    productID = graphene.Int()
+    productName = graphene.String()
+    productDesc = graphene.String()
+    price = graphene.Float()
+    itemPrice = graphene.Float()
+    conditionScore = graphene.Float()
+    availability = graphene.Boolean()
+    originalImageUrl = graphene.String()
+    userID = graphene.Int()
+
+class User(graphene.ObjectType):
+    userID = graphene.Int()
+    name = graphene.String()
+    email = graphene.String()
+    phoneNo = graphene.String()
+    street1 = graphene.String()
+    city = graphene.String()
+    state = graphene.String()
+    zip = graphene.String()
+    country = graphene.String()
+
 class Order(graphene.ObjectType):
     orderID = graphene.String()
     paymentAmount = graphene.Float()
@@ -32,18 +509,454 @@ class Order(graphene.ObjectType):
     endDate = graphene.String()
     status = graphene.String()
     userID = graphene.Int()
+    version = graphene.Int()
+    product = graphene.Field(Product)
+    user = graphene.Field(User)
+    renter = graphene.Field(User)
+
+    # Nested fields go through the request's DataLoaders, so a list of orders
+    # costs one product batch and one round of user lookups, not one call per order
+    def resolve_product(self, info):
+        if self.productID is None:
+            return None
+        return info.context["loaders"].products.load(self.productID)
+
+    def resolve_user(self, info):
+        if self.userID is None:
+            return None
+        return info.context["loaders"].users.load(self.userID)
+
+    def resolve_renter(self, info):
+        if self.renterID is None:
+            return None
+        return info.context["loaders"].users.load(self.renterID)
+
+http_session = requests.Session()
+http_session.mount("http://", HTTPAdapter(pool_maxsize=20))
+http_session.mount("https://", HTTPAdapter(pool_maxsize=20))
+user_lookup_executor = ThreadPoolExecutor(max_workers=int(os.getenv("USER_LOOKUP_POOL_SIZE", 8)))
+
+def batch_load_products(product_ids):
+    """Load every product referenced in a request with one inventory batchGet call."""
+    try:
+        response = http_session.post(INVENTORY_BATCH_GET_URL, json={"productIDs": list(product_ids)}, timeout=(3.05, 10))
+        response.raise_for_status()
+        products = response.json().get("products", {})
+    except Exception as e:
+        print(f"Error loading products {list(product_ids)}: {e}")
+        products = {}
+    return Promise.resolve([to_graphene(Product, products.get(str(product_id))) for product_id in product_ids])
+
+def fetch_user(user_id):
+    try:
+        response = http_session.get(f"{USER_INFO_URL}?id={user_id}", timeout=(3.05, 10))
+        if response.status_code != 200:
+            return None
+        return response.json().get("details")
+    except Exception as e:
+        print(f"Error loading user {user_id}: {e}")
+        return None
+
+def batch_load_users(user_ids):
+    """The user service has no bulk API, so distinct users are fetched concurrently."""
+    details = list(user_lookup_executor.map(fetch_user, user_ids))
+    return Promise.resolve([to_graphene(User, dict(data, userID=user_id) if data else None)
+                            for user_id, data in zip(user_ids, details)])
+
+def to_graphene(object_type, data):
+    """Build a graphene object from a dict, ignoring fields the type does not declare."""
+    if data is None:
+        return None
+    return object_type(**{key: value for key, value in data.items() if key in object_type._meta.fields})
+
+class RequestLoaders:
+    """
+    DataLoaders for a single GraphQL request. Nested lookups made while
+    resolving one query are deduplicated and batched, and nothing is cached
+    across requests.
+    """
+
+    def __init__(self):
+        self.products = DataLoader(batch_load_products, max_batch_size=MAX_PRODUCT_BATCH)
+        self.users = DataLoader(batch_load_users)
+
+# Estimated rows returned by list fields that have no first/limit argument
+LIST_COST_ESTIMATES = {"orders": MAX_QUERY_LIMIT, "overdueOrders": MAX_QUERY_LIMIT,
+                       "ordersByUser": 100, "ordersByRenter": 100}
+# Unbounded per-user lists, priced by the user's orderCount: field -> (summary role, ID argument)
+SUMMARY_SIZED_LISTS = {"ordersByUser": ("user", "userID"), "ordersByRenter": ("renter", "renterID")}
+
+def summary_order_count(role, user_id):
+    """orderCount from the user's order summary, or None if it cannot be read."""
+    try:
+        db = get_firestore_client()
+        snapshot = db.collection(SUMMARY_COLLECTION).document(summary_doc_id(role, user_id)).get()
+        return int(snapshot.get("orderCount") or 0) if snapshot.exists else 0
+    except Exception as e:
+        print(f"⚠️ Could not read the {role} summary of {user_id} for query cost: {e}")
+        return None
+
+def query_cost(document_ast, operation_name, variables):
+    """
+    Static cost of the operation that will run: (depth, complexity).
+    Every field costs 1, and a list field multiplies the cost of its
+    selections by its page size (first/limit, literal or variable). Without
+    one, ordersByUser/ordersByRenter return every order of that user, so they
+    are priced by the orderCount in the user's summary; other lists use their
+    entry in LIST_COST_ESTIMATES. Introspection fields are free.
+    """
+    fragments = {definition.name.value: definition for definition in document_ast.definitions
+                 if isinstance(definition, ast.FragmentDefinition)}
+    operations = [definition for definition in document_ast.definitions
+                  if isinstance(definition, ast.OperationDefinition)]
+    operation = next((op for op in operations
+                      if operation_name is None or (op.name is not None and op.name.value == operation_name)), None)
+    if operation is None:
+        return 0, 0
+
+    def int_argument(field, names):
+        for argument in field.arguments or []:
+            if argument.name.value in names:
+                value = argument.value
+                if isinstance(value, ast.Variable):
+                    value = (variables or {}).get(value.name.value)
+                elif isinstance(value, ast.IntValue):
+                    value = int(value.value)
+                if isinstance(value, int):
+                    return value
+        return None
+
+    def page_size(field):
+        value = int_argument(field, ("first", "limit"))
+        if value is not None:
+            return max(1, min(value, MAX_QUERY_LIMIT))
+        name = field.name.value
+        if name.endswith("Connection"):
+            return DEFAULT_PAGE_SIZE
+        if name in SUMMARY_SIZED_LISTS:
+            role, id_argument = SUMMARY_SIZED_LISTS[name]
+            user_id = int_argument(field, (id_argument,))
+            count = summary_order_count(role, user_id) if user_id is not None else None
+            if count is not None:
+                return max(1, count)
+        return LIST_COST_ESTIMATES.get(name, 1)
+
+    def walk(selection_set, depth, seen_fragments):
+        max_depth, complexity = depth, 0
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                if selection.name.value.startswith("__"):
+                    continue
+                complexity += 1
+                if selection.selection_set is not None:
+                    child_depth, child_complexity = walk(selection.selection_set, depth + 1, seen_fragments)
+                    max_depth = max(max_depth, child_depth)
+                    complexity += page_size(selection) * child_complexity
+            else:
+                if isinstance(selection, ast.FragmentSpread):
+                    name = selection.name.value
+                    if name in seen_fragments or name not in fragments:
+                        continue
+                    fragment_selections, seen_fragments = fragments[name].selection_set, seen_fragments | {name}
+                else:
+                    fragment_selections = selection.selection_set
+                child_depth, child_complexity = walk(fragment_selections, depth, seen_fragments)
+                max_depth = max(max_depth, child_depth)
+                complexity += child_complexity
+        return max_depth, complexity
+
+    return walk(operation.selection_set, 1, frozenset())
+
+class ResolverMetrics:
+    """Latency histograms for the root resolvers, plus counts of queries rejected by the cost limits."""
+
+    BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resolvers = {}
+        self.rejected = collections.Counter()
+
+    def observe(self, name, elapsed_ms):
+        with self.lock:
+            entry = self.resolvers.get(name)
+            if entry is None:
+                entry = self.resolvers[name] = {"count": 0, "sumMs": 0.0, "maxMs": 0.0,
+                                                "buckets": [0] * (len(self.BUCKETS_MS) + 1)}
+            entry["count"] += 1
+            entry["sumMs"] += elapsed_ms
+            entry["maxMs"] = max(entry["maxMs"], elapsed_ms)
+            entry["buckets"][bisect.bisect_left(self.BUCKETS_MS, elapsed_ms)] += 1
+
+    def record_rejection(self, reason):
+        with self.lock:
+            self.rejected[reason] += 1
+
+    def snapshot(self):
+        labels = [f"le{bound}" for bound in self.BUCKETS_MS] + ["inf"]
+        with self.lock:
+            resolvers = {
+                name: {
+                    "count": entry["count"],
+                    "avgMs": round(entry["sumMs"] / entry["count"], 2),
+                    "maxMs": round(entry["maxMs"], 2),
+                    "bucketsMs": dict(zip(labels, entry["buckets"])),
+                }
+                for name, entry in sorted(self.resolvers.items())
+            }
+            return {"resolvers": resolvers, "rejectedQueries": dict(self.rejected)}
+
+resolver_metrics = ResolverMetrics()
+
+class ResolverTimingMiddleware:
+    """Times every Query and Mutation field resolver (resolve_orders, resolve_overdueOrders, ...)."""
+
+    def resolve(self, next, root, info, **args):
+        parent = info.parent_type.name
+        if parent not in ("Query", "Mutation"):
+            return next(root, info, **args)
+        start = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            resolver_metrics.observe(f"{parent}.{info.field_name}", (time.perf_counter() - start) * 1000)
+
+class CachedDocumentBackend(GraphQLCoreBackend):
+    """
+    GraphQL backend that keeps an LRU of parsed and validated documents keyed
+    by query text. Repeated queries (check_expiry's overdueOrders, the order
+    composite's GetOrder) skip parsing and validation and go straight to
+    execution. Documents that fail validation are not cached. Every
+    execution is first checked against MAX_QUERY_DEPTH and
+    MAX_QUERY_COMPLEXITY with the request's variables.
+    """
+
+    def __init__(self, max_size):
+        super().__init__()
+        self.max_size = max_size
+        self.documents = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def document_from_string(self, schema, document_string):
+        with self.lock:
+            document = self.documents.get(document_string)
+            if document is not None and document.schema is schema:
+                self.documents.move_to_end(document_string)
+                self.stats["hits"] += 1
+                return document
+            self.stats["misses"] += 1
+
+        document = super().document_from_string(schema, document_string)
+        errors = validate(schema, document.document_ast)
+        if errors:
+            return GraphQLDocument(schema=schema, document_string=document_string, document_ast=document.document_ast,
+                                   execute=lambda *args, **kwargs: ExecutionResult(errors=errors, invalid=True))
+
+        # Validated once here, so execution skips validation
+        document = GraphQLDocument(schema=schema, document_string=document_string, document_ast=document.document_ast,
+                                   execute=partial(self._execute, schema, document.document_ast))
+        with self.lock:
+            self.documents[document_string] = document
+            while len(self.documents) > self.max_size:
+                self.documents.popitem(last=False)
+        return document
+
+    def _execute(self, schema, document_ast, **kwargs):
+        variables = kwargs.get("variables") or kwargs.get("variable_values")
+        depth, complexity = query_cost(document_ast, kwargs.get("operation_name"), variables)
+        if depth > MAX_QUERY_DEPTH:
+            resolver_metrics.record_rejection("depth")
+            return ExecutionResult(errors=[GraphQLError(
+                f"Query depth {depth} exceeds the maximum of {MAX_QUERY_DEPTH}")], invalid=True)
+        if complexity > MAX_QUERY_COMPLEXITY:
+            resolver_metrics.record_rejection("complexity")
+            return ExecutionResult(errors=[GraphQLError(
+                f"Query complexity {complexity} exceeds the maximum of {MAX_QUERY_COMPLEXITY}; "
+                f"request fewer fields or pass a smaller first/limit")], invalid=True)
+        return execute(schema, document_ast, **dict(self.execute_params, **kwargs))
+
+    def cache_stats(self):
+        with self.lock:
+            return dict(self.stats, size=len(self.documents), maxSize=self.max_size)
+
+class PersistedQueryRegistry:
+    """
+    Automatic persisted queries (the Apollo protocol): a client sends
+    extensions.persistedQuery.sha256Hash instead of the query text. Unknown
+    hashes get a PersistedQueryNotFound error, and the client retries with the
+    text and hash, which registers it. The registry is a per-process LRU, so
+    a restart only costs each client one retry.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.queries = collections.OrderedDict()  # sha256 hex -> query text
+        self.lock = threading.Lock()
+
+    def resolve(self, params, query_args=None):
+        """Return request params with the query text filled in from the registry."""
+        if not isinstance(params, dict):
+            return params
+        extensions = params.get("extensions") or (query_args or {}).get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpQueryError(400, "extensions must be a JSON object")
+        persisted = (extensions or {}).get("persistedQuery") if isinstance(extensions, dict) else None
+        if not persisted:
+            return params
+
+        query_hash = persisted.get("sha256Hash")
+        if persisted.get("version") != 1 or not query_hash:
+            raise HttpQueryError(400, "Unsupported persistedQuery version")
+        query = params.get("query") or (query_args or {}).get("query")
+        with self.lock:
+            if query:
+                if hashlib.sha256(query.encode()).hexdigest() != query_hash:
+                    raise HttpQueryError(400, "provided sha does not match query")
+                self.queries[query_hash] = query
+                self.queries.move_to_end(query_hash)
+                while len(self.queries) > self.max_size:
+                    self.queries.popitem(last=False)
+                return params
+            query = self.queries.get(query_hash)
+            if query is None:
+                # Apollo clients look for this message to resend the full query
+                raise HttpQueryError(200, "PersistedQueryNotFound")
+            self.queries.move_to_end(query_hash)
+        return dict(params, query=query)
+
+document_backend = CachedDocumentBackend(DOCUMENT_CACHE_SIZE)
+persisted_queries = PersistedQueryRegistry(PERSISTED_QUERY_CACHE_SIZE)
+
+class OrderGraphQLView(GraphQLView):
+    def parse_body(self):
+        data = super().parse_body()
+        if isinstance(data, list):
+            return [persisted_queries.resolve(entry) for entry in data]
+        return persisted_queries.resolve(data, request.args)
+
+    def get_context(self):
+        # Flask-GraphQL's default context is the request object itself, so build a dict
+        return {"request": request, "loaders": RequestLoaders()}
+
+class StatusCount(graphene.ObjectType):
+    status = graphene.String()
+    count = graphene.Int()
+
+class OrderSummary(graphene.ObjectType):
+    orderCount = graphene.Int()
+    activeRentals = graphene.Int()
+    statusCounts = graphene.List(StatusCount)
+    lateDailyAmount = graphene.Float(description="Sum of dailyPayment over orders currently late")
+    lifetimeAmount = graphene.Float(description="Payments of paid/shipping/late/completed orders")
+    updatedAt = graphene.String()
+
+    @staticmethod
+    def from_doc(snapshot):
+        data = snapshot.to_dict() if snapshot.exists else {}
+        updated_at = data.get("updatedAt")
+        return OrderSummary(
+            orderCount=data.get("orderCount", 0),
+            activeRentals=data.get("activeRentals", 0),
+            statusCounts=[StatusCount(status=status, count=count)
+                          for status, count in sorted(data.get("statusCounts", {}).items()) if count],
+            lateDailyAmount=round(data.get("lateDailyAmount", 0), 2),
+            lifetimeAmount=round(data.get("lifetimeAmount", 0), 2),
+            updatedAt=updated_at.isoformat() if isinstance(updated_at, datetime) else None,
+        )
+
+class UserSummary(graphene.ObjectType):
+    userID = graphene.Int()
+    asUser = graphene.Field(OrderSummary, description="Orders the user rented")
+    asRenter = graphene.Field(OrderSummary, description="Orders the user rented out")
+
+class OrderConnection(graphene.relay.Connection):
+    class Meta:
+        node = Order
+
+class OrderSortField(graphene.Enum):
+    startDate = "startDate"
+    endDate = "endDate"
+
+class SortDirection(graphene.Enum):
+    ASC = "ASC"
+    DESC = "DESC"
+
+def connection_args(**scope):
+    """Arguments shared by the *Connection fields, plus the scope argument (e.g. userID)."""
+    return dict(scope, first=graphene.Int(), after=graphene.String(), orderBy=OrderSortField(),
+                direction=SortDirection(), status=graphene.List(graphene.String))
+
+def encode_cursor(doc_id):
+    return base64.urlsafe_b64encode(doc_id.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        return base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (ValueError, UnicodeError):
+        raise GraphQLError("Invalid cursor")
+
+def resolve_order_connection(equals, first=None, after=None, orderBy=None, direction=None, status=None):
+    """
+    One page of orders, sorted and filtered in Firestore. Fetches first + 1
+    documents to know whether there is a next page, so page cost depends only
+    on the page size, not on how many orders match.
+    """
+    first = DEFAULT_PAGE_SIZE if first is None else first
+    if first <= 0 or first > MAX_PAGE_SIZE:
+        raise GraphQLError(f"first must be between 1 and {MAX_PAGE_SIZE}")
+    if status is not None and not 1 <= len(status) <= 10:
+        raise GraphQLError("status must list between 1 and 10 statuses")
+
+    db = get_firestore_client()
+    start_after = None
+    if after:
+        start_after = db.collection(COLLECTION_NAME).document(decode_cursor(after)).get()
+        if not start_after.exists:
+            raise GraphQLError("Invalid cursor")
+
+    try:
+        docs = list(order_query(db, equals=equals, statuses=status, order_by=orderBy or "startDate",
+                                descending=(direction or "DESC") == "DESC", start_after=start_after,
+                                limit=first + 1).stream())
+    except Exception as e:
+        print(f"Error in resolve_order_connection: {e}")
+        docs = []
+
+    edges = [OrderConnection.Edge(node=Order(**convert_order_data(doc.to_dict())), cursor=encode_cursor(doc.id))
+             for doc in docs[:first]]
+    return OrderConnection(edges=edges, page_info=graphene.relay.PageInfo(
+        has_next_page=len(docs) > first,
+        has_previous_page=start_after is not None,
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+    ))
 
 class Query(graphene.ObjectType):
-    orders = graphene.List(Order)
+    orders = graphene.List(Order, limit=graphene.Int(), description=(
+        f"At most limit orders, capped at {MAX_QUERY_LIMIT} (the default); use ordersConnection to page through all"))
     order = graphene.Field(Order, orderID=graphene.String(required=True))
     overdueOrders = graphene.List(Order)
-    ordersByUser = graphene.List(Order, userID=graphene.Int(required=True))
-    ordersByRenter = graphene.List(Order, renterID=graphene.Int(required=True))
+    ordersByUser = graphene.List(Order, userID=graphene.Int(required=True), limit=graphene.Int(), description=(
+        f"Newest orders first: all of them, or at most limit (capped at {MAX_QUERY_LIMIT}); "
+        f"use ordersByUserConnection to page"))
+    ordersByRenter = graphene.List(Order, renterID=graphene.Int(required=True), limit=graphene.Int(), description=(
+        f"Newest orders first: all of them, or at most limit (capped at {MAX_QUERY_LIMIT}); "
+        f"use ordersByRenterConnection to page"))
+    # Paginated versions of the lists above (first/after cursors, sorting and status filters in Firestore)
+    ordersConnection = graphene.Field(OrderConnection, **connection_args())
+    ordersByUserConnection = graphene.Field(OrderConnection, **connection_args(userID=graphene.Int(required=True)))
+    ordersByRenterConnection = graphene.Field(OrderConnection, **connection_args(renterID=graphene.Int(required=True)))
+    userSummary = graphene.Field(UserSummary, userID=graphene.Int(required=True))
 
-    def resolve_orders(self, info):
+    def resolve_orders(self, info, limit=None):
         try:
             db = get_firestore_client()
-            docs = db.collection(COLLECTION_NAME).stream()
+            # Never stream the whole collection: at most MAX_QUERY_LIMIT orders
+            docs = order_query(db, limit=min(limit or MAX_QUERY_LIMIT, MAX_QUERY_LIMIT)).stream()
             return [Order(**convert_order_data(doc.to_dict())) for doc in docs]
         except Exception as e:
             print(f"Error in resolve_orders: {e}")
@@ -52,8 +965,8 @@ class Query(graphene.ObjectType):
     def resolve_order(self, info, orderID):
         try:
             db = get_firestore_client()
-            docs = db.collection(COLLECTION_NAME).where("orderID", "==", orderID).stream()
-            for doc in docs:
+            doc = db.collection(COLLECTION_NAME).document(order_doc_id(orderID)).get()
+            if doc.exists:
                 return Order(**convert_order_data(doc.to_dict()))
             return None
         except Exception as e:
@@ -64,40 +977,56 @@ class Query(graphene.ObjectType):
         try:
             db = get_firestore_client()
             now = datetime.now(timezone.utc)
-            orders_list = []
-            seen_ids = set()
-            for doc in db.collection(COLLECTION_NAME).where("status", "==", "late").stream():
-                if doc.id not in seen_ids:
-                    orders_list.append(Order(**convert_order_data(doc.to_dict())))
-                    seen_ids.add(doc.id)
-            for doc in db.collection(COLLECTION_NAME).where("status", "==", "paid").stream():
-                data = doc.to_dict()
-                if isinstance(data.get("endDate"), datetime) and data["endDate"] < now and doc.id not in seen_ids:
-                    orders_list.append(Order(**convert_order_data(data)))
-                    seen_ids.add(doc.id)
-            return orders_list
+            # One indexed range query (status, endDate): reads only the orders that are overdue
+            docs = order_query(db, statuses=OVERDUE_STATUSES, range_filter=("endDate", "<", now),
+                               order_by="endDate").stream()
+            return [Order(**convert_order_data(doc.to_dict())) for doc in docs]
         except Exception as e:
             print(f"Error in resolve_overdueOrders: {e}")
             return []
 
-    def resolve_ordersByUser(self, info, userID):
+    def resolve_ordersByUser(self, info, userID, limit=None):
         try:
             db = get_firestore_client()
-            docs = db.collection(COLLECTION_NAME).where("userID", "==", userID).stream()
+            docs = order_query(db, equals={"userID": userID}, order_by="startDate", descending=True,
+                               limit=min(limit, MAX_QUERY_LIMIT) if limit else None).stream()
             return [Order(**convert_order_data(doc.to_dict())) for doc in docs]
         except Exception as e:
             print(f"Error in resolve_ordersByUser: {e}")
             return []
 
-    def resolve_ordersByRenter(self, info, renterID):
+    def resolve_ordersByRenter(self, info, renterID, limit=None):
         try:
             db = get_firestore_client()
-            docs = db.collection(COLLECTION_NAME).where("renterID", "==", renterID).stream()
+            docs = order_query(db, equals={"renterID": renterID}, order_by="startDate", descending=True,
+                               limit=min(limit, MAX_QUERY_LIMIT) if limit else None).stream()
             return [Order(**convert_order_data(doc.to_dict())) for doc in docs]
         except Exception as e:
             print(f"Error in resolve_ordersByRenter: {e}")
             return []
 
+    def resolve_userSummary(self, info, userID):
+        try:
+            db = get_firestore_client()
+            collection = db.collection(SUMMARY_COLLECTION)
+            refs = [collection.document(summary_doc_id("user", userID)), collection.document(summary_doc_id("renter", userID))]
+            snapshots = {snapshot.id: snapshot for snapshot in db.get_all(refs)}
+            return UserSummary(userID=userID,
+                               asUser=OrderSummary.from_doc(snapshots[refs[0].id]),
+                               asRenter=OrderSummary.from_doc(snapshots[refs[1].id]))
+        except Exception as e:
+            print(f"Error in resolve_userSummary: {e}")
+            return None
+
+    def resolve_ordersConnection(self, info, **kwargs):
+        return resolve_order_connection({}, **kwargs)
+
+    def resolve_ordersByUserConnection(self, info, userID, **kwargs):
+        return resolve_order_connection({"userID": userID}, **kwargs)
+
+    def resolve_ordersByRenterConnection(self, info, renterID, **kwargs):
+        return resolve_order_connection({"renterID": renterID}, **kwargs)
+
 class UpdateOrderStatus(graphene.Mutation):
     class Arguments:
         orderID = graphene.String(required=True)
@@ -110,29 +1039,69 @@ class UpdateOrderStatus(graphene.Mutation):
 
     def mutate(self, info, orderID, status):
         try:
-            db = firestore.Client()
-            docs = db.collection(COLLECTION_NAME).where("orderID", "==", orderID).stream()
-            updated = False
-            for doc in docs:
-                doc.reference.update({"status": status})
-                updated = True
-            if updated:
-                return UpdateOrderStatus(orderID=orderID, status=status, ok=True, message="Status updated")
-            else:
-                return UpdateOrderStatus(ok=False, message="Order not found")
+            event = set_order_status(get_firestore_client(), orderID, status)
+            return UpdateOrderStatus(orderID=orderID, status=status, ok=True,
+                                     message="Status updated" if event else "Status unchanged")
+        except NotFound:
+            return UpdateOrderStatus(ok=False, message="Order not found")
         except Exception as e:
             return UpdateOrderStatus(ok=False, message=str(e))
 
+class OrderStatusInput(graphene.InputObjectType):
+    orderID = graphene.String(required=True)
+    status = graphene.String(required=True)
+
+class OrderStatusResult(graphene.ObjectType):
+    orderID = graphene.String()
+    status = graphene.String()
+    ok = graphene.Boolean()
+    error = graphene.String()
+
+class UpdateOrderStatuses(graphene.Mutation):
+    class Arguments:
+        updates = graphene.List(graphene.NonNull(OrderStatusInput), required=True)
+
+    results = graphene.List(OrderStatusResult)
+    ok = graphene.Boolean()
+    message = graphene.String()
+
+    def mutate(self, info, updates):
+        if not updates or len(updates) > MAX_BATCH_UPDATE:
+            return UpdateOrderStatuses(ok=False, message=f"Between 1 and {MAX_BATCH_UPDATE} updates per request")
+        try:
+            results = apply_status_updates(get_firestore_client(),
+                                           [(update.orderID, update.status) for update in updates])
+        except Exception as e:
+            return UpdateOrderStatuses(ok=False, message=str(e))
+        failed = sum(1 for result in results if not result["ok"])
+        return UpdateOrderStatuses(results=[OrderStatusResult(**result) for result in results], ok=failed == 0,
+                                   message=f"{len(results) - failed} updated, {failed} failed")
+
 class Mutation(graphene.ObjectType):
     update_order_status = UpdateOrderStatus.Field()
+    update_order_statuses = UpdateOrderStatuses.Field()
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
 
 app.add_url_rule(
     '/graphql',
-    view_func=GraphQLView.as_view('graphql', schema=schema, graphiql=True)
+    view_func=OrderGraphQLView.as_view('graphql', schema=schema, graphiql=True, backend=document_backend,
+                                       middleware=[ResolverTimingMiddleware()])
 )
 
+@app.route('/health', methods=['GET'])
+def health():
+    result = firestore_pool.health()
+    result["documentCache"] = document_backend.cache_stats()
+    return jsonify(result), 200 if result["status"] == "ok" else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-resolver latency histograms, rejected query counts and document cache stats for this process."""
+    result = resolver_metrics.snapshot()
+    result["documentCache"] = document_backend.cache_stats()
+    return jsonify(result)
+
 @app.route('/orders', methods=['POST'])
 def create_order_rest():
     try:
@@ -142,6 +1111,8 @@ def create_order_rest():
         for field in required_fields:
             if field not in data:
                 return jsonify({"error": f"Missing field: {field}"}), 400
+        if not str(data["orderID"]) or "/" in str(data["orderID"]):
+            return jsonify({"error": "Invalid orderID"}), 400
 
         # Convert string dates to datetime
         start_date = datetime.fromisoformat(data["startDate"])
@@ -163,17 +1134,61 @@ def create_order_rest():
             "endDate": end_date,
             "status": data["status"],
             "userID": int(data["userID"]),
-            "dailyPayment": daily_payment
+            "dailyPayment": daily_payment,
+            "version": 1
         }
 
         db = get_firestore_client()
-        db.collection(COLLECTION_NAME).add(order_doc)
+        # create() fails rather than overwrite if the orderID already exists;
+        # the user's and renter's summaries change in the same batch
+        batch = db.batch()
+        batch.create(db.collection(COLLECTION_NAME).document(order_doc_id(data["orderID"])), order_doc)
+        summaries = SummaryDeltas()
+        summaries.add(order_doc, None, order_doc["status"])
+        summaries.write(db, batch)
+        batch.commit()
+        order_events.publish([status_change_event(order_doc, None, order_doc["status"], 1)])
         return jsonify({"message": "Order created successfully"}), 201
 
+    except AlreadyExists:
+        return jsonify({"error": f"Order {data['orderID']} already exists"}), 409
     except Exception as e:
         print(f"❌ Error in create_order_rest: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/orders/events', methods=['GET'])
+def order_events_stream():
+    """
+    Server-Sent Events stream of order.status_changed events for orders where
+    the given user is the user or the renter.
+    Query parameters: userID (required)
+    """
+    user_id = request.args.get("userID", type=int)
+    if user_id is None:
+        return jsonify({"error": "userID is required"}), 400
+    events = order_event_stream.subscribe(user_id)
+    if events is None:
+        return jsonify({"error": "Too many event streams, try again later"}), 503
+
+    def generate():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = events.get(timeout=EVENT_STREAM_HEARTBEAT)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['orderID']}:{event['version']}\nevent: {STATUS_CHANGED_ROUTING_KEY}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            order_event_stream.unsubscribe(user_id, events)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
 @app.route('/orders/<order_id>', methods=['PATCH'])
 def update_order_status_rest(order_id):
     try:
@@ -183,20 +1198,38 @@ def update_order_status_rest(order_id):
         if not new_status:
             return jsonify({"error": "Missing status field"}), 400
 
-        db = get_firestore_client()
-        docs = db.collection(COLLECTION_NAME).where("orderID", "==", order_id).stream()
+        event = set_order_status(get_firestore_client(), order_id, new_status)
+        message = "Order status updated" if event else "Order status unchanged"
+        return jsonify({"message": message, "orderID": order_id, "newStatus": new_status}), 200
 
-        updated = False
-        for doc in docs:
-            doc.reference.update({"status": new_status})
-            updated = True
+    except NotFound:
+        return jsonify({"error": "Order not found"}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        if updated:
-            return jsonify({"message": "Order status updated", "orderID": order_id, "newStatus": new_status}), 200
-        else:
-            return jsonify({"error": "Order not found"}), 404
+@app.route('/orders:batch', methods=['PATCH'])
+def update_order_statuses_rest():
+    """
+    Update many order statuses in one Firestore batched write.
+    Body: {"updates": [{"orderID": "...", "status": "..."}, ...]} (at most MAX_BATCH_UPDATE)
+    Returns: {"results": [{"orderID", "ok", "status" or "error"}], "updated": n, "failed": n}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        updates = data.get("updates")
+        if not isinstance(updates, list) or not 1 <= len(updates) <= MAX_BATCH_UPDATE:
+            return jsonify({"error": f"updates must be a list of 1 to {MAX_BATCH_UPDATE} items"}), 400
+        for update in updates:
+            if not isinstance(update, dict) or not update.get("orderID") or not update.get("status"):
+                return jsonify({"error": "Each update needs orderID and status"}), 400
+
+        results = apply_status_updates(get_firestore_client(),
+                                       [(update["orderID"], update["status"]) for update in updates])
+        failed = sum(1 for result in results if not result["ok"])
+        return jsonify({"results": results, "updated": len(results) - failed, "failed": failed}), 200
 
     except Exception as e:
+        print(f"❌ Error in update_order_statuses_rest: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
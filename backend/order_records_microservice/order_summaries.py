@@ -0,0 +1,88 @@
+"""
+Materialized per-user and per-renter order summaries.
+
+Each user has a summary document for the orders they rented ("user-<userID>")
+and each renter one for the orders they rented out ("renter-<renterID>").
+orderRecords.py keeps them current by adding the change from every order
+write, in the same batch or transaction as the write itself, so a dashboard
+is one document read instead of a scan of the user's history.
+rebuild_order_summaries.py recomputes them from scratch.
+"""
+import os
+
+from google.cloud import firestore
+
+SUMMARY_COLLECTION = os.getenv("ORDER_SUMMARY_COLLECTION", "orderSummaries")
+# Orders the customer currently has in hand (or overdue)
+ACTIVE_STATUSES = frozenset(["paid", "shipping", "late"])
+# Orders whose payment counts towards lifetime spend / earnings
+SPEND_STATUSES = frozenset(["paid", "shipping", "late", "completed"])
+
+
+def summary_doc_id(role, user_id):
+    """role is "user" or "renter"."""
+    return f"{role}-{user_id}"
+
+
+class SummaryDeltas:
+    """
+    Accumulates summary changes per summary document, so each document is
+    written once per batch however many of its orders the batch touches.
+    """
+
+    NUMERIC_FIELDS = ["orderCount", "activeRentals", "lateDailyAmount", "lifetimeAmount"]
+
+    def __init__(self):
+        self.docs = {}  # summary doc ID -> {"statusCounts": {status: n}, <numeric field>: n}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, data, before, after):
+        """Record an order moving from status before (None for a new order) to after."""
+        if before == after:
+            return
+        amount = float(data.get("paymentAmount") or 0)
+        daily = float(data.get("dailyPayment") or 0)
+
+        def contribution(status):
+            return {
+                "orderCount": 0,
+                "activeRentals": 1 if status in ACTIVE_STATUSES else 0,
+                "lateDailyAmount": daily if status == "late" else 0,
+                "lifetimeAmount": amount if status in SPEND_STATUSES else 0,
+            }
+
+        old, new = contribution(before), contribution(after)
+        if before is None:
+            new["orderCount"] = 1
+        for role in ("user", "renter"):
+            user_id = data.get(f"{role}ID")
+            if user_id is None:
+                continue
+            doc = self.docs.setdefault(summary_doc_id(role, user_id), {"statusCounts": {}})
+            for field in self.NUMERIC_FIELDS:
+                doc[field] = doc.get(field, 0) + new[field] - old[field]
+            counts = doc["statusCounts"]
+            if before is not None:
+                counts[before] = counts.get(before, 0) - 1
+            counts[after] = counts.get(after, 0) + 1
+
+    def write(self, db, writer, absolute=False):
+        """
+        Add the accumulated changes to a WriteBatch or Transaction as merge
+        writes with Increment transforms, or as plain values when absolute.
+        """
+        collection = db.collection(SUMMARY_COLLECTION)
+        value = (lambda n: n) if absolute else firestore.Increment
+        for doc_id, doc in self.docs.items():
+            role, user_id = doc_id.split("-", 1)
+            fields = {field: value(doc.get(field, 0)) for field in self.NUMERIC_FIELDS}
+            fields["statusCounts"] = {status: value(n) for status, n in doc["statusCounts"].items() if absolute or n}
+            fields["role"] = role
+            fields["userID"] = int(user_id)
+            fields["updatedAt"] = firestore.SERVER_TIMESTAMP
+            if absolute:
+                writer.set(collection.document(doc_id), fields)
+            else:
+                writer.set(collection.document(doc_id), fields, merge=True)
@@ -0,0 +1,57 @@
+"""
+Recompute every order summary document from the order records.
+
+orderRecords.py maintains the summaries incrementally; run this once to
+backfill them for orders created before summaries existed, or to repair them.
+Run it with the order records service stopped, from this directory:
+    python rebuild_order_summaries.py --dry-run
+    python rebuild_order_summaries.py
+"""
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from google.cloud import firestore
+
+from order_summaries import SummaryDeltas
+
+BATCH_SIZE = 400
+
+
+def rebuild(db, collection_name, dry_run=False):
+    summaries = SummaryDeltas()
+    count = 0
+    for doc in db.collection(collection_name).stream():
+        data = doc.to_dict()
+        if data.get("status"):
+            summaries.add(data, None, data["status"])
+            count += 1
+
+    print(f"🔍 {count} orders, {len(summaries)} summaries")
+    if dry_run:
+        for doc_id, summary in sorted(summaries.docs.items()):
+            print(f"  {doc_id}: {summary}")
+        return len(summaries)
+
+    doc_ids = list(summaries.docs)
+    for start in range(0, len(doc_ids), BATCH_SIZE):
+        chunk = SummaryDeltas()
+        chunk.docs = {doc_id: summaries.docs[doc_id] for doc_id in doc_ids[start:start + BATCH_SIZE]}
+        batch = db.batch()
+        chunk.write(db, batch, absolute=True)
+        batch.commit()
+        print(f"✅ Wrote {min(start + BATCH_SIZE, len(doc_ids))}/{len(doc_ids)}")
+    return len(summaries)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="print the summaries without writing")
+    parser.add_argument("--collection", default=os.getenv("FIRESTORE_COLLECTION", "default_collection"),
+                        help="order records collection (defaults to FIRESTORE_COLLECTION)")
+    args = parser.parse_args()
+
+    rebuild(firestore.Client(), args.collection, dry_run=args.dry_run)
+    sys.exit(0)
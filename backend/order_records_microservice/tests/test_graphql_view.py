@@ -0,0 +1,51 @@
+"""Runs a query through the /graphql view with Firestore and the inventory service faked out."""
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", "credentials.json")
+
+
+@pytest.fixture(scope="module")
+def order_records():
+    # The module warms up a Firestore client pool at import time
+    with mock.patch("google.cloud.firestore.Client"):
+        import orderRecords
+    return orderRecords
+
+
+def fake_db(order):
+    snapshot = mock.Mock(exists=True, id=order["orderID"])
+    snapshot.to_dict.return_value = dict(order)
+    db = mock.MagicMock()
+    db.collection.return_value.document.return_value.get.return_value = snapshot
+    return db
+
+
+def test_order_query_with_nested_product(order_records, monkeypatch):
+    order = {"orderID": "abc", "productID": 7, "userID": 1, "renterID": 2, "status": "paid", "version": 3}
+    monkeypatch.setattr(order_records, "get_firestore_client", lambda: fake_db(order))
+    product_batches = []
+
+    def batch_load_products(product_ids):
+        product_batches.append(list(product_ids))
+        return order_records.Promise.resolve(
+            [order_records.Product(productID=pid, productName=f"Product {pid}") for pid in product_ids])
+
+    monkeypatch.setattr(order_records, "batch_load_products", batch_load_products)
+
+    client = order_records.app.test_client()
+    response = client.post("/graphql", json={
+        "query": 'query GetOrder($orderID: String!) { order(orderID: $orderID) { orderID status version product { productName } } }',
+        "variables": {"orderID": "abc"},
+    })
+
+    assert response.status_code == 200, response.get_data(as_text=True)
+    body = response.get_json()
+    assert "errors" not in body
+    assert body["data"]["order"] == {"orderID": "abc", "status": "paid", "version": 3,
+                                     "product": {"productName": "Product 7"}}
+    assert product_batches == [[7]]
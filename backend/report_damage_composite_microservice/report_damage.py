@@ -5,6 +5,8 @@ import os
 import uuid
 import sys
 import logging
+from product_cache import ProductCache
+from service_client import ServiceClient
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 app = Flask(__name__)
 CORS(app)
@@ -15,6 +17,15 @@ NOTIFICATION_SERVICE_URL = os.environ.get("NOTIFICATION_SERVICE_URL")
 TRANSACTION_SERVICE_URL = os.environ.get("TRANSACTION_SERVICE_URL")
 CONDITION_SERVICE_URL = os.environ.get("CONDITION_SERVICE_URL")
 USER_SERVICE_URL = os.environ.get("USER_SERVICE_URL")
+RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", "rabbitmq")
+EXCHANGE_NAME = os.environ.get("EXCHANGE_NAME", "order_exchange")
+
+# Pooled HTTP clients, one per downstream, with per-service timeouts
+inventory_client = ServiceClient("inventory", read_timeout=5)
+condition_client = ServiceClient("condition", read_timeout=60)  # waits on the image similarity API
+transaction_client = ServiceClient("transaction", read_timeout=30)  # Stripe refunds can be slow
+user_client = ServiceClient("user", connect_timeout=5, read_timeout=15)  # OutSystems, over the WAN
+notification_client = ServiceClient("notification", read_timeout=15)
 
 # IMGUR_CLIENT_ID = os.environ.get("IMGUR_CLIENT_ID")
 
@@ -46,7 +57,7 @@ KNOWN_DAMAGE_KEYWORDS = ["scratch", "stain", "dent", "tear", "crack", "broken"]
 def get_user_email(user_id):
     try:
         url = f"{USER_SERVICE_URL}/getEmail/?id={user_id}"
-        response = requests.get(url, timeout=10)
+        response = user_client.get(url)
         response.raise_for_status()
 
         data = response.json()
@@ -67,12 +78,22 @@ def extract_keywords(description: str):
     description = description.lower()
     return [kw for kw in KNOWN_DAMAGE_KEYWORDS if kw in description]
 
+# product cache loader, the cache is invalidated by inventory.changed events
+def fetch_product(product_id):
+    response = inventory_client.get(f"{INVENTORY_SERVICE_URL}/inventory/products/{product_id}")
+    response.raise_for_status()
+    product_data = response.json()
+    if "error" in product_data:
+        return None
+    return product_data
+
+product_cache = ProductCache(fetch_product, RABBITMQ_HOST, exchange=EXCHANGE_NAME)
+product_cache.start()
+
 # get userID of person renting to update availability in inventory
 def get_user_id_from_product(product_id):
     try:
-        response = requests.get(f"{INVENTORY_SERVICE_URL}/inventory/products/{product_id}")
-        response.raise_for_status()
-        product_data = response.json()
+        product_data = product_cache.get(product_id) or {}
         user_id = product_data.get("userID")
         
         if user_id is not None:
@@ -105,10 +126,13 @@ def submit_damage_report():
     damage_keywords = extract_keywords(description) 
     
     # Step 2: Get original item image and score
-    inventory_response = requests.get(f"{INVENTORY_SERVICE_URL}/inventory/products/{product_id}")
-    if inventory_response.status_code != 200:
+    try:
+        inventory_data = product_cache.get(product_id)
+    except requests.exceptions.RequestException as e:
+        logging.debug(f"❌ Error fetching product {product_id}: {e}")
+        inventory_data = None
+    if inventory_data is None:
         return jsonify({"error": "Failed to fetch inventory details"}), 500
-    inventory_data = inventory_response.json()
     product_name = inventory_data.get('productName')
     original_image = inventory_data.get('originalImageUrl')
     original_condition = inventory_data.get('conditionScore')
@@ -130,7 +154,7 @@ def submit_damage_report():
       "availability": availability
       
     }
-    condition_response = requests.post(f"{CONDITION_SERVICE_URL}/compareImages", json=condition_payload)
+    condition_response = condition_client.post(f"{CONDITION_SERVICE_URL}/compareImages", json=condition_payload)
     logging.debug(condition_response)
     new_condition = original_condition
     # # Handle response
@@ -154,7 +178,7 @@ def submit_damage_report():
         }
         if availability == False:
             inventory_payload["availability"]=False
-        inventory_upd_response = requests.put(
+        inventory_upd_response = inventory_client.put(
         f"{INVENTORY_SERVICE_URL}/inventory/products/{product_id}", json=inventory_payload)
         # )
         # if inventory_upd_response.code==200:
@@ -196,7 +220,7 @@ def submit_damage_report():
             refund_payload = {
                 "orderID": order_id
             }
-            refund_response = requests.post(f"{TRANSACTION_SERVICE_URL}/transaction/refund", json=refund_payload)
+            refund_response = transaction_client.post(f"{TRANSACTION_SERVICE_URL}/transaction/refund", json=refund_payload)
             
 
             if refund_response.status_code == 200:
@@ -214,7 +238,7 @@ def submit_damage_report():
                 "userID": user_id,
                 "change": 20
             }
-            penalty_response = requests.put(f"{USER_SERVICE_URL}/updateUserScore", json=penalty_payload)
+            penalty_response = user_client.put(f"{USER_SERVICE_URL}/updateUserScore", json=penalty_payload)
 
             if penalty_response.status_code == 200:
                 penalty_applied = True
@@ -227,7 +251,7 @@ def submit_damage_report():
         logging.debug("📨 Sending notification to /isDamaged endpoint")
         logging.debug(f"📤 Payload to Notification Service:\n{notif_payload}")
 
-        notif_response = requests.post(
+        notif_response = notification_client.post(
             f"{NOTIFICATION_SERVICE_URL}/notification/damage-report/isDamaged",
             json=notif_payload
         )
@@ -247,7 +271,7 @@ def submit_damage_report():
         logging.debug("📨 Sending notification to /notDamaged endpoint")
         logging.debug(f"📤 Payload to Notification Service:\n{notif_payload}")
 
-        notif_response = requests.post(
+        notif_response = notification_client.post(
             f"{NOTIFICATION_SERVICE_URL}/notification/damage-report/notDamaged",
             json=notif_payload
         )